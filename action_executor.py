@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+
+import robot_backend
+
+
+class ActionFailed(Exception):
+    pass
+
+
+class DeadlineExceeded(ActionFailed):
+    pass
+
+
+class ActionPolicy:
+    def __init__(self, timeout=30.0, attempts=3, backoff=0.5, factor=2.0, max_backoff=4.0):
+        """
+        :param timeout: seconds one attempt may take, an attempt that takes longer is aborted
+        :param attempts: attempts before ActionFailed
+        :param backoff: seconds before the second attempt, multiplied by factor for every further one
+        :param max_backoff: cap of the pause between attempts
+        """
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt):
+        # pause after the given failed attempt, counting from 0
+        return min(self.backoff * self.factor ** attempt, self.max_backoff)
+
+
+# per SDK action, actions without an entry use DEFAULT_POLICY
+POLICIES = {"pickup_object": ActionPolicy(timeout=40.0, attempts=3),
+            "place_on_object": ActionPolicy(timeout=40.0, attempts=3),
+            "go_to_pose": ActionPolicy(timeout=40.0, attempts=2),
+            "go_to_object": ActionPolicy(timeout=40.0, attempts=2)}
+DEFAULT_POLICY = ActionPolicy(timeout=20.0, attempts=1)
+
+
+def sdk_errors():
+    # SDK exceptions that fail one attempt of an action, e.g. the robot still busy with an aborted one
+    exceptions = robot_backend.sdk().exceptions
+    return tuple(getattr(exceptions, name) for name in ("ActionError", "RobotBusy") if hasattr(exceptions, name))
+
+
+# loop time the running phase has to be done by, None without a phase budget
+deadline = contextvars.ContextVar("deadline", default=None)
+# retries before the action being started, set by ActionExecutor.run and recorded by action_trace
+attempt = contextvars.ContextVar("attempt", default=0)
+
+
+async def act(action):
+    # wait for an SDK action, cancelling the wait aborts the action on the robot as well
+    try:
+        return await action.wait_for_completed()
+    except asyncio.CancelledError:
+        action.abort()
+        raise
+
+
+class ActionExecutor:
+    # runs SDK actions within time budgets, retrying failed attempts with exponential backoff
+    def __init__(self, policies=None, default=DEFAULT_POLICY, clock=None, errors=None):
+        """
+        :param policies: overrides of POLICIES
+        :param default: policy of the actions without one
+        :param clock: time source, default the running loop's time()
+        :param errors: exception types that count as a failed attempt, default sdk_errors()
+        """
+        self.policies = dict(POLICIES, **(policies or {}))
+        self.default = default
+        self.clock = clock
+        self.errors = tuple(errors) if errors is not None else sdk_errors()
+        self.attempts = 0
+        self.failures = 0
+        self.given_up = []
+
+    def now(self):
+        return self.clock() if self.clock is not None else asyncio.get_event_loop().time()
+
+    def remaining(self):
+        # seconds left in the running phase, None without a budget
+        end = deadline.get()
+        return None if end is None else end - self.now()
+
+    async def run(self, robot, name, *args, **kwargs):
+        """
+        start robot.<name>(*args, **kwargs) until an attempt succeeds
+        :return: the succeeded action
+        :raise ActionFailed: every attempt failed, DeadlineExceeded: the phase budget ran out first
+        """
+        policy = self.policies.get(name, self.default)
+        error = None
+        for i in range(policy.attempts):
+            timeout = policy.timeout
+            remaining = self.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise DeadlineExceeded("no time left for {}".format(name))
+                timeout = min(timeout, remaining)
+            self.attempts += 1
+            try:
+                token = attempt.set(i)
+                try:
+                    action = getattr(robot, name)(*args, **kwargs)
+                finally:
+                    attempt.reset(token)
+                await asyncio.wait_for(act(action), timeout)
+            except asyncio.TimeoutError:
+                # act() has aborted the action on the robot
+                error = "timed out after {:.0f}s".format(timeout)
+            except self.errors as e:
+                error = repr(e)
+            else:
+                if action.has_succeeded:
+                    return action
+                error = None
+            self.failures += 1
+            if i + 1 < policy.attempts:
+                delay = policy.delay(i)
+                remaining = self.remaining()
+                await asyncio.sleep(delay if remaining is None else max(min(delay, remaining), 0))
+        raise ActionFailed("{} failed {} times".format(name, policy.attempts) +
+                           (", last {}".format(error) if error is not None else ""))
+
+    async def within(self, seconds, fn):
+        """
+        run fn() as a phase of at most seconds, nested phases keep the earlier deadline. actions started by run get
+        at most the time left, an overrun cancels fn and with it the running SDK actions
+        :raise DeadlineExceeded: the phase overran
+        """
+        end = self.now() + seconds
+        outer = deadline.get()
+        if outer is not None:
+            end = min(end, outer)
+        token = deadline.set(end)
+        try:
+            return await asyncio.wait_for(fn(), max(end - self.now(), 0))
+        except asyncio.TimeoutError:
+            if self.now() < end:
+                raise
+            raise DeadlineExceeded("phase overran its {}s budget".format(seconds))
+        finally:
+            deadline.reset(token)
+
+    def instrument(self, graph, budgets):
+        """
+        run the nodes of an action_graph.ActionGraph within budgets, a node that runs out of time or attempts ends
+        without raising so the session goes on
+        :param budgets: node name up to the first "/" -> seconds, e.g. {"plays_cube": 180}
+        """
+        for node in graph.nodes.values():
+            seconds = budgets.get(node.name.split("/")[0])
+            if seconds is not None:
+                node.fn = self._budgeted(node.name, seconds, node.fn)
+        return graph
+
+    def _budgeted(self, name, seconds, fn):
+        async def run():
+            try:
+                return await self.within(seconds, fn)
+            except ActionFailed as e:
+                self.given_up.append((name, str(e)))
+                print("{} gave up: {}".format(name, e))
+        return run
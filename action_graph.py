@@ -0,0 +1,137 @@
+import asyncio
+
+
+class Node:
+    def __init__(self, name, fn, after, robot):
+        """
+        :param name: unique node name
+        :param fn: coroutine function without arguments
+        :param after: names of the nodes that must finish first
+        :param robot: robot id the node occupies, None for nodes that only wait or compute
+        """
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.robot = robot
+        self.start = None
+        self.end = None
+        self.result = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return "<Node {} robot {} {}>".format(self.name, self.robot, self.after)
+
+
+class ActionGraph:
+    # dependency graph of robot actions, every node starts as soon as the nodes it comes after have finished
+    def __init__(self, clock=None, locks=None):
+        """
+        :param clock: time source, default the running loop's time() so virtual time is reported as well
+        :param locks: robot id -> asyncio.Lock held while a node of that robot runs, lets code outside the graph
+                      borrow a robot between two of its nodes
+        """
+        self.nodes = {}
+        self.clock = clock
+        self.locks = locks or {}
+        self.started = None
+        self.ended = None
+
+    def add(self, name, fn, after=(), robot=None):
+        # dependencies must already exist, so the graph can never have a cycle
+        if name in self.nodes:
+            raise ValueError("node {} already exists".format(name))
+        missing = [dep for dep in after if dep not in self.nodes]
+        if missing:
+            raise ValueError("node {} comes after unknown nodes {}".format(name, missing))
+        self.nodes[name] = Node(name, fn, after, robot)
+        return name
+
+    def _now(self):
+        return self.clock() if self.clock is not None else asyncio.get_event_loop().time()
+
+    async def run(self):
+        # run every node, the first failure cancels the rest and is raised
+        tasks = {}
+
+        async def run_node(node):
+            if node.after:
+                await asyncio.gather(*(tasks[dep] for dep in node.after))
+            lock = self.locks.get(node.robot)
+            if lock is None:
+                return await run_fn(node)
+            async with lock:
+                return await run_fn(node)
+
+        async def run_fn(node):
+            node.start = self._now()
+            node.result = await node.fn()
+            node.end = self._now()
+            return node.result
+
+        self.started = self._now()
+        for name, node in self.nodes.items():
+            tasks[name] = asyncio.ensure_future(run_node(node))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.ended = self._now()
+        return GraphReport(self)
+
+
+class GraphReport:
+    def __init__(self, graph):
+        self.nodes = graph.nodes
+        self.started = graph.started
+        self.ended = graph.ended
+
+    @property
+    def makespan(self):
+        return self.ended - self.started
+
+    def critical_path(self):
+        # walk back from the last node to finish, always through the dependency that finished last
+        node = max(self.nodes.values(), key=lambda n: n.end)
+        path = [node]
+        while node.after:
+            node = max((self.nodes[dep] for dep in node.after), key=lambda n: n.end)
+            path.append(node)
+        return path[::-1]
+
+    def busy_time(self, robot):
+        # union of the intervals the robot was running nodes
+        intervals = sorted((n.start, n.end) for n in self.nodes.values() if n.robot == robot)
+        busy, current_start, current_end = 0.0, None, None
+        for start, end in intervals:
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            busy += current_end - current_start
+        return busy
+
+    def robots(self):
+        return sorted({n.robot for n in self.nodes.values() if n.robot is not None})
+
+    def idle_time(self):
+        # per robot, time within the session the robot was not running any node
+        return {robot: self.makespan - self.busy_time(robot) for robot in self.robots()}
+
+    def summary(self):
+        print("session {:.2f}s".format(self.makespan))
+        print("critical path:")
+        for node in self.critical_path():
+            print("  {:<24} robot {} {:8.2f}s -> {:8.2f}s".format(
+                node.name, node.robot, node.start - self.started, node.end - self.started))
+        for robot, idle in self.idle_time().items():
+            print("robot {} idle {:.2f}s ({:.0%})".format(robot, idle, idle / self.makespan if self.makespan else 0))
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import json
+import struct
+import numpy as np
+
+from action_executor import attempt
+
+
+# robot methods that start an SDK action, traced from dispatch until wait_for_completed returns
+ACTIONS = ("pickup_object", "place_on_object", "place_object_on_ground_here", "go_to_pose", "go_to_object",
+           "play_anim_trigger", "turn_in_place", "drive_straight", "set_lift_height", "set_head_angle")
+# world coroutines that wait for something to be seen
+WAITS = ("wait_until_observe_num_objects", "wait_for_observed_face")
+OUTCOMES = ("succeeded", "failed", "aborted", "timeout", "error", "open")
+
+# the game phase of the running task, set per action_graph node by Tracer.instrument
+phase = contextvars.ContextVar("phase", default="")
+
+# compact log: MAGIC, header length (<u4), JSON header with the string tables, then the records
+MAGIC = b"CZTR"
+RECORD_DTYPE = np.dtype([("robot", "<i2"), ("phase", "<u2"), ("name", "<u2"), ("outcome", "u1"), ("retries", "i1"),
+                         ("start", "<f8"), ("end", "<f8")])
+
+# record fields, a record is a list so a span can be closed in place. RETRIES counts the failed attempts of
+# ActionExecutor.run before this one, so the attempts of one action share robot, phase and name and count up from 0
+ROBOT, PHASE, NAME, START, END, RETRIES, OUTCOME = range(7)
+
+
+class Tracer:
+    def __init__(self, clock=None, enabled=True):
+        """
+        :param clock: time source, default the running loop's time() so virtual time is traced as well
+        :param enabled: a disabled tracer wraps nothing and records nothing
+        """
+        self.clock = clock
+        self.enabled = enabled
+        self.records = []
+
+    def now(self):
+        return self.clock() if self.clock is not None else asyncio.get_event_loop().time()
+
+    def begin(self, robot, name, retries=0):
+        record = [robot, phase.get(), name, self.now(), None, retries, "open"]
+        self.records.append(record)
+        return record
+
+    def end(self, record, outcome):
+        # the first outcome wins, e.g. an abort followed by the cancelled wait
+        if record[OUTCOME] == "open":
+            record[END] = self.now()
+            record[OUTCOME] = outcome
+
+    def span(self, robot, name):
+        # async with tracer.span(aid, "wait_for_tap"): ...
+        return _Span(self, robot, name)
+
+    def wrap_robot(self, robot, aid):
+        return TracedRobot(robot, self, aid) if self.enabled else robot
+
+    def instrument(self, graph):
+        # every node of an action_graph.ActionGraph runs with its name as the phase
+        if not self.enabled:
+            return graph
+        for node in graph.nodes.values():
+            node.fn = _in_phase(node.name, node.fn)
+        return graph
+
+    # export
+
+    def tables(self):
+        phases = sorted({r[PHASE] for r in self.records})
+        names = sorted({r[NAME] for r in self.records})
+        return phases, names
+
+    def to_array(self):
+        phases, names = self.tables()
+        phase_id = {p: i for i, p in enumerate(phases)}
+        name_id = {n: i for i, n in enumerate(names)}
+        outcome_id = {o: i for i, o in enumerate(OUTCOMES)}
+        array = np.empty(len(self.records), dtype=RECORD_DTYPE)
+        for i, r in enumerate(self.records):
+            array[i] = (r[ROBOT] if r[ROBOT] is not None else -1, phase_id[r[PHASE]], name_id[r[NAME]],
+                        outcome_id[r[OUTCOME]], min(r[RETRIES], 127), r[START],
+                        r[END] if r[END] is not None else np.nan)
+        return array, phases, names
+
+    def write_binary(self, path):
+        array, phases, names = self.to_array()
+        header = json.dumps({"version": 1, "phases": phases, "names": names, "outcomes": OUTCOMES,
+                             "dtype": RECORD_DTYPE.descr}).encode()
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(array.tobytes())
+        return len(array)
+
+    def chrome_trace(self):
+        # Chrome trace event format, one thread per robot, open the file in chrome://tracing or Perfetto
+        t0 = min((r[START] for r in self.records), default=0.0)
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "tower building game"}}]
+        for robot in sorted({r[ROBOT] for r in self.records if r[ROBOT] is not None}):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": robot,
+                           "args": {"name": "robot {}".format(robot)}})
+        for r in self.records:
+            end = r[END] if r[END] is not None else r[START]
+            events.append({"name": r[NAME], "cat": r[PHASE] or "session", "ph": "X", "pid": 1,
+                           "tid": r[ROBOT] if r[ROBOT] is not None else 0,
+                           "ts": (r[START] - t0) * 1e6, "dur": (end - r[START]) * 1e6,
+                           "args": {"retries": r[RETRIES], "outcome": r[OUTCOME]}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return len(self.records)
+
+    def summary(self):
+        # count, total and mean seconds per action
+        totals = {}
+        for r in self.records:
+            if r[END] is not None:
+                count, total = totals.get(r[NAME], (0, 0.0))
+                totals[r[NAME]] = (count + 1, total + r[END] - r[START])
+        for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            print("{:<32} {:5d} {:9.2f}s {:7.2f}s".format(name, count, total, total / count))
+
+
+def read_binary(path):
+    """
+    :return: (header dict, structured array with RECORD_DTYPE)
+    """
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError("{} is not an action trace".format(path))
+        length, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+        return header, np.frombuffer(f.read(), dtype=RECORD_DTYPE)
+
+
+def _in_phase(name, fn):
+    async def run():
+        phase.set(name)
+        return await fn()
+    return run
+
+
+class _Span:
+    def __init__(self, tracer, robot, name):
+        self.tracer = tracer
+        self.robot = robot
+        self.name = name
+        self.record = None
+
+    async def __aenter__(self):
+        if self.tracer.enabled:
+            self.record = self.tracer.begin(self.robot, self.name)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.record is not None:
+            self.tracer.end(self.record, _outcome(exc_type))
+
+
+def _outcome(exc_type):
+    if exc_type is None:
+        return "succeeded"
+    if issubclass(exc_type, asyncio.CancelledError):
+        return "aborted"
+    if issubclass(exc_type, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+
+class TracedAction:
+    __slots__ = ("action", "tracer", "record")
+
+    def __init__(self, action, tracer, record):
+        self.action = action
+        self.tracer = tracer
+        self.record = record
+
+    def __getattr__(self, name):
+        return getattr(self.action, name)
+
+    async def wait_for_completed(self, timeout=None):
+        try:
+            result = await self.action.wait_for_completed(timeout=timeout)
+        except BaseException as e:
+            self.tracer.end(self.record, _outcome(type(e)))
+            raise
+        self.tracer.end(self.record, "succeeded" if self.action.has_succeeded else "failed")
+        return result
+
+    def abort(self, *args, **kwargs):
+        self.tracer.end(self.record, "aborted")
+        return self.action.abort(*args, **kwargs)
+
+
+class TracedWorld:
+    def __init__(self, world, tracer, aid):
+        self._world = world
+        self._tracer = tracer
+        self._aid = aid
+
+    def __getattr__(self, name):
+        attr = getattr(self._world, name)
+        if name in WAITS:
+            async def wait(*args, **kwargs):
+                async with self._tracer.span(self._aid, name):
+                    return await attr(*args, **kwargs)
+            return wait
+        return attr
+
+
+class TracedRobot:
+    # proxy of an SDK robot whose actions and waits are traced, everything else goes to the robot
+    def __init__(self, robot, tracer, aid):
+        self._robot = robot
+        self._tracer = tracer
+        self.aid = aid
+        self.world = TracedWorld(robot.world, tracer, aid)
+
+    def __getattr__(self, name):
+        attr = getattr(self._robot, name)
+        if name in ACTIONS:
+            def start(*args, **kwargs):
+                record = self._tracer.begin(self.aid, name, attempt.get())
+                try:
+                    action = attr(*args, **kwargs)
+                except BaseException as e:
+                    self._tracer.end(record, _outcome(type(e)))
+                    raise
+                return TracedAction(action, self._tracer, record)
+            return start
+        return attr
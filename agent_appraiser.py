@@ -0,0 +1,77 @@
+import numpy as np
+
+from emotion_model import Emotion, Event2Emotion
+from batch_appraisal import N_EMOTIONS, PROTOTYPES
+from appraisal_kernel import compile_signature, signature
+
+
+class AgentAppraiser:
+    # long-lived appraiser of one agent: compiled rules, preallocated buffers and a running mood
+    def __init__(self, personality, context="social", mood=(0.25, 0), mood_weight=0.2, mood_rate=0.1):
+        """
+        :param personality: Personality of the agent
+        :param context: default context of the events, 'individual' / 'social'
+        :param mood: initial (valence, arousal) mood, Event2Emotion starts at (0.25, 0)
+        :param mood_weight: share of the mood in every new emotion, as in Event2Emotion.mood_regulation
+        :param mood_rate: how fast the mood follows the emotions, 0 keeps it fixed
+        """
+        self.personality = personality
+        self.context = context
+        self.mood_weight = mood_weight
+        self.mood_rate = mood_rate
+        self.initial_mood = tuple(mood)
+        # buffers reused by every event
+        self.weights = np.zeros(N_EMOTIONS)
+        self.inputs = np.ones(4)
+        self.raw = np.zeros(2)
+        self.emotion = np.zeros(2)
+        self.mood = np.zeros(2)
+        self.reset()
+
+    def reset(self):
+        self.mood[:] = self.initial_mood
+        self.emotion[:] = self.initial_mood
+        self.events = 0
+
+    def apply(self, event, context=None):
+        """
+        appraise one event, blend in the mood and move the mood towards the result
+        :return: (valence, arousal) of the new emotion
+        """
+        coef = compile_signature(signature(event, self.personality, context or self.context))
+        self.inputs[1] = event.importance
+        self.inputs[2] = event.event_objects.familiarity
+        self.inputs[3] = event.total_progress
+        np.dot(coef, self.inputs, out=self.weights)
+        self.weights /= self.weights.sum()
+        np.dot(self.weights, PROTOTYPES, out=self.raw)
+        # emotion = (1 - w) * appraised + w * mood, mood += rate * (emotion - mood)
+        np.multiply(self.raw, 1 - self.mood_weight, out=self.emotion)
+        self.emotion += self.mood_weight * self.mood
+        self.mood += self.mood_rate * (self.emotion - self.mood)
+        self.events += 1
+        return self.emotion[0], self.emotion[1]
+
+    def apply_many(self, events, context=None):
+        # (N x 2) emotions of a stream of events, in order
+        out = np.empty((len(events), 2))
+        for i, event in enumerate(events):
+            out[i] = self.apply(event, context)
+        return out
+
+    def current_emotion(self):
+        return Emotion(x=float(self.emotion[0]), y=float(self.emotion[1]))
+
+    def current_mood(self):
+        return Emotion(x=float(self.mood[0]), y=float(self.mood[1]))
+
+    def event2emotion(self, event, context=None):
+        # the same step through the interpretive Event2Emotion, for checking
+        e2e = Event2Emotion(event, self.personality)
+        e2e.mood = tuple(self.mood)
+        e2e.perceive()
+        e2e.apprise(context or self.context)
+        e2e.regulate()
+        e2e.calculate_emotion()
+        e2e.mood_regulation(self.mood_weight)
+        return e2e
@@ -0,0 +1,140 @@
+from functools import lru_cache
+import numpy as np
+
+from emotion_model import EmotionSpace, Event2Emotion, Event, EventObjects, Personality
+from batch_appraisal import EventBatch, PROTOTYPES, bits_from_traits, personality_matrix, random_events, scalar_appraise
+
+
+# Within one boolean signature every emotion weight of perceive/apprise/regulate is affine in the three continuous
+# inputs, weight = c0 + c1 * importance + c2 * familiarity + c3 * total_progress. A signature packs every boolean
+# the rules branch on into one int:
+#   bits 0-3   condition, resource_available, suddeness, risk
+#   bits 4-8   personality O, C, E, A, N, i.e. Personality.bits
+#   bit  9     contribution == 0
+#   bit  10    familiarity > 0
+#   bit  11    total_progress == 1
+#   bits 12-13 sign of importance, 0: zero, 1: positive, 2: negative
+#   bits 14-15 context, 0: other, 1: individual, 2: social
+CONTEXTS = {"individual": 1, "social": 2}
+CACHE_SIZE = 1024
+
+
+def pack_signature(condition, resource_available, suddeness, risk, personality_bits, contribution_zero, familiar,
+                   progress_done, importance_sign, context_code):
+    sig = int(condition) | int(resource_available) << 1 | int(suddeness) << 2 | int(risk) << 3 | personality_bits << 4
+    return (sig | int(contribution_zero) << 9 | int(familiar) << 10 | int(progress_done) << 11 |
+            importance_sign << 12 | context_code << 14)
+
+
+def signature(event, personality, context):
+    # boolean signature of one event
+    importance_sign = 1 if event.importance > 0 else 2 if event.importance < 0 else 0
+    return pack_signature(event.condition, event.resource_available, event.suddeness, event.event_objects.risk,
+                          personality.bits, event.contribution == 0,
+                          event.event_objects.familiarity > 0, event.total_progress == 1, importance_sign,
+                          CONTEXTS.get(context, 0))
+
+
+def batch_signatures(events, traits, context):
+    # signatures of an EventBatch, same packing as signature()
+    n = len(events)
+    context = np.broadcast_to(np.asarray(context), (n,))
+    sig = (events.condition.astype(np.int64) | events.resource_available << 1 | events.suddeness << 2 |
+           events.risk << 3 | bits_from_traits(traits) << 4)
+    sig |= (events.contribution == 0).astype(np.int64) << 9
+    sig |= (events.familiarity > 0).astype(np.int64) << 10
+    sig |= (events.total_progress == 1).astype(np.int64) << 11
+    sig |= np.where(events.importance > 0, 1, np.where(events.importance < 0, 2, 0)) << 12
+    sig |= np.where(context == "individual", 1, np.where(context == "social", 2, 0)) << 14
+    return sig
+
+
+def _probe(sig, importance, familiarity, total_progress):
+    # run the interpretive rules on an event that has the given signature
+    bit = lambda i: bool(sig >> i & 1)
+    personality = Personality.from_bits(sig >> 4)
+    objects = EventObjects("probe", False, familiarity, bit(3))
+    event = Event("probe", importance, bit(0), bit(1), bit(2), objects, total_progress, 0 if bit(9) else 1)
+    context = {1: "individual", 2: "social"}.get(sig >> 14 & 3, "other")
+    e2e = Event2Emotion(event, personality)
+    e2e.perceive()
+    e2e.apprise(context)
+    e2e.regulate()
+    return np.array([e2e.emotions_weight[e] for e in EmotionSpace.emotions], dtype=np.float64)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_signature(sig):
+    """
+    affine coefficients of one signature, derived from Event2Emotion by probing points inside the signature
+    :param sig: int, see pack_signature
+    :return: (14 x 4) read-only array, columns: constant, importance, familiarity, total_progress
+    """
+    sign = sig >> 12 & 3
+    imp = {0: (0, 0), 1: (1, 2), 2: (-1, -2)}[sign]
+    fam = (1, 2) if sig >> 10 & 1 else (-1, -2)
+    # total_progress is pinned to 1 when bit 11 is set, its term folds into the constant
+    tp = (1, 1) if sig >> 11 & 1 else (2, 3)
+    base = _probe(sig, imp[0], fam[0], tp[0])
+    coef = np.zeros((len(EmotionSpace.emotions), 4), dtype=np.float64)
+    if imp[0] != imp[1]:
+        coef[:, 1] = (_probe(sig, imp[1], fam[0], tp[0]) - base) / (imp[1] - imp[0])
+    coef[:, 2] = (_probe(sig, imp[0], fam[1], tp[0]) - base) / (fam[1] - fam[0])
+    if tp[0] != tp[1]:
+        coef[:, 3] = (_probe(sig, imp[0], fam[0], tp[1]) - base) / (tp[1] - tp[0])
+    coef[:, 0] = base - coef[:, 1] * imp[0] - coef[:, 2] * fam[0] - coef[:, 3] * tp[0]
+    coef.setflags(write=False)
+    return coef
+
+
+def kernel_weights(event, personality, context):
+    # raw emotion weights of one event: one table lookup plus a dot product
+    coef = compile_signature(signature(event, personality, context))
+    return coef @ np.array([1.0, event.importance, event.event_objects.familiarity, event.total_progress])
+
+
+def kernel_appraise(event, personality, context):
+    # normalized weights and (valence, arousal) of one event
+    weights = kernel_weights(event, personality, context)
+    weights = weights / weights.sum()
+    x, y = weights @ PROTOTYPES
+    return weights, (x, y)
+
+
+def kernel_batch_weights(events, traits, context):
+    # raw weights of an EventBatch, every distinct signature is compiled once
+    if not isinstance(events, EventBatch):
+        events = EventBatch.from_events(events)
+    if not isinstance(traits, np.ndarray):
+        traits = personality_matrix(traits)
+    sigs, inverse = np.unique(batch_signatures(events, traits, context), return_inverse=True)
+    table = np.stack([compile_signature(int(s)) for s in sigs])[inverse.ravel()]
+    inputs = np.stack([np.ones(len(events)), events.importance, events.familiarity, events.total_progress], axis=1)
+    return np.einsum("nek,nk->ne", table, inputs)
+
+
+def cache_info():
+    return compile_signature.cache_info()
+
+
+def clear_cache():
+    compile_signature.cache_clear()
+
+
+def check_against_interpreter(n=2000, seed=0):
+    # the compiled kernel must agree with Event2Emotion
+    events, personalities = random_events(n, seed)
+    for context in ("individual", "social"):
+        batch = kernel_batch_weights(events, personalities, context)
+        for i, (event, personality) in enumerate(zip(events, personalities)):
+            e2e = scalar_appraise(event, personality, context)
+            weights, (x, y) = kernel_appraise(event, personality, context)
+            expected = [e2e.emotions_weight[e] for e in EmotionSpace.emotions]
+            assert np.allclose(weights, expected, rtol=1e-12, atol=1e-12), (context, i)
+            assert np.allclose(batch[i] / batch[i].sum(), expected, rtol=1e-12, atol=1e-12), (context, i)
+            assert np.allclose((x, y), (e2e.emotion.x, e2e.emotion.y), rtol=0, atol=1e-12), (context, i)
+
+
+if __name__ == '__main__':
+    check_against_interpreter()
+    print("compiled kernel matches Event2Emotion,", cache_info())
@@ -0,0 +1,100 @@
+import sys
+import time
+from collections import defaultdict
+
+from emotion_model import Event2Emotion
+
+
+STAGES = ("perceive", "apprise", "regulate", "normalize_weights", "calculate_emotion")
+
+
+class MetricsRegistry:
+    # wall time and calls per stage, plus how often and how much each change_emotion_weight call site fired
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stage_calls = defaultdict(int)
+        self.stage_time = defaultdict(float)
+        # (stage, line, emotion) -> count / summed weight
+        self.branch_calls = defaultdict(int)
+        self.branch_weight = defaultdict(float)
+
+    def record_stage(self, stage, seconds):
+        self.stage_calls[stage] += 1
+        self.stage_time[stage] += seconds
+
+    def record_branch(self, stage, line, emotion, changes):
+        key = (stage, line, emotion)
+        self.branch_calls[key] += 1
+        self.branch_weight[key] += changes
+
+    def stages(self):
+        return {stage: {"calls": self.stage_calls[stage], "seconds": self.stage_time[stage],
+                        "mean": self.stage_time[stage] / self.stage_calls[stage] if self.stage_calls[stage] else 0.0}
+                for stage in STAGES if stage in self.stage_calls}
+
+    def hot_branches(self, n=None):
+        # rule branches ordered by how often they fired: (stage, line, emotion, calls, total weight)
+        rows = [key + (calls, self.branch_weight[key]) for key, calls in self.branch_calls.items()]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows if n is None else rows[:n]
+
+    def report(self):
+        return {"stages": self.stages(),
+                "branches": [{"stage": stage, "line": line, "emotion": emo, "calls": calls, "weight": weight}
+                             for stage, line, emo, calls, weight in self.hot_branches()]}
+
+
+# shared registry used when none is given
+registry = MetricsRegistry(enabled=False)
+
+
+def _timed(stage):
+    # wrap an Event2Emotion stage with timing and stage tracking
+    method = getattr(Event2Emotion, stage)
+
+    def run(self, *args, **kwargs):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return method(self, *args, **kwargs)
+        outer = self.stage
+        self.stage = stage
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics.record_stage(stage, time.perf_counter() - start)
+            self.stage = outer
+    run.__name__ = stage
+    run.__doc__ = method.__doc__
+    return run
+
+
+class InstrumentedEvent2Emotion(Event2Emotion):
+    # Event2Emotion that reports to a MetricsRegistry, plain Event2Emotion carries no instrumentation cost
+    def __init__(self, event, personality, metrics=None):
+        self.metrics = registry if metrics is None else metrics
+        self.stage = None
+        super().__init__(event, personality)
+
+    perceive = _timed("perceive")
+    apprise = _timed("apprise")
+    regulate = _timed("regulate")
+    normalize_weights = _timed("normalize_weights")
+    calculate_emotion = _timed("calculate_emotion")
+
+    def change_emotion_weight(self, emotion, changes):
+        if self.metrics.enabled:
+            # the calling line identifies the rule branch
+            self.metrics.record_branch(self.stage, sys._getframe(1).f_lineno, emotion, changes)
+        super().change_emotion_weight(emotion, changes)
+
+
+def enable(metrics=None):
+    (registry if metrics is None else metrics).enabled = True
+
+
+def disable(metrics=None):
+    (registry if metrics is None else metrics).enabled = False
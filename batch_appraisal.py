@@ -0,0 +1,278 @@
+import random
+import numpy as np
+
+from emotion_model import EmotionSpace, Event2Emotion, Event, EventObjects, Personality
+
+
+N_EMOTIONS = len(EmotionSpace.emotions)
+# order of the personality columns
+TRAITS = Personality.TRAITS
+
+
+def prototype_matrix():
+    # (14 x 2) valence/arousal of the emotion prototypes, rows follow EmotionSpace.emotions
+    protos = Event2Emotion.init_emotions()
+    return np.array([[protos[e]["x"], protos[e]["y"]] for e in EmotionSpace.emotions], dtype=np.float64)
+
+
+PROTOTYPES = prototype_matrix()
+
+# rule constants of Event2Emotion, every raw weight is linear in them
+PARAMS = {"importance": 10,    # importance scaling, also doubled in apprise
+          "neutral": 2,        # annoyed at importance == 0
+          "resource": 2.5,     # resource available / missing after failure
+          "suddeness": 10,
+          "familiarity": 2.5,  # familiarity scaling
+          "risk": 5,           # risky objects in perceive
+          "risk_trait": 10,    # risky objects for N and O
+          "context": 10,       # extraversion in individual / social context
+          "contribution": 20,  # social contribution for N
+          "agreeable": 10,     # relaxed / peaceful for A without contribution
+          "progress": 10,      # total_progress scaling
+          "completion": 100}   # total_progress == 1
+PARAM_NAMES = tuple(PARAMS)
+DEFAULT_PARAMS = np.array([PARAMS[name] for name in PARAM_NAMES], dtype=np.float64)
+
+
+class EventBatch:
+    # struct-of-arrays version of N events, one entry per event
+    def __init__(self, importance, condition, resource_available, suddeness, familiarity, risk,
+                 total_progress, contribution):
+        """
+        :param importance: float array [-1, 1]
+        :param condition: bool array
+        :param resource_available: bool array
+        :param suddeness: bool array
+        :param familiarity: float array [-1, 1], familiarity of the event objects
+        :param risk: bool array, risk of the event objects
+        :param total_progress: float array
+        :param contribution: float array
+        """
+        self.importance = np.asarray(importance, dtype=np.float64)
+        self.condition = np.asarray(condition, dtype=bool)
+        self.resource_available = np.asarray(resource_available, dtype=bool)
+        self.suddeness = np.asarray(suddeness, dtype=bool)
+        self.familiarity = np.asarray(familiarity, dtype=np.float64)
+        self.risk = np.asarray(risk, dtype=bool)
+        self.total_progress = np.asarray(total_progress, dtype=np.float64)
+        self.contribution = np.asarray(contribution, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.importance)
+
+    @classmethod
+    def from_events(cls, events):
+        # collect the columns of a list of Event
+        return cls(importance=[e.importance for e in events],
+                   condition=[bool(e.condition) for e in events],
+                   resource_available=[bool(e.resource_available) for e in events],
+                   suddeness=[bool(e.suddeness) for e in events],
+                   familiarity=[e.event_objects.familiarity for e in events],
+                   risk=[bool(e.event_objects.risk) for e in events],
+                   total_progress=[e.total_progress for e in events],
+                   contribution=[e.contribution for e in events])
+
+
+def traits_from_bits(bits):
+    # (N x 5) bool matrix from packed Personality.bits
+    return (np.asarray(bits, dtype=np.int64).reshape(-1, 1) >> np.arange(5) & 1).astype(bool)
+
+
+def bits_from_traits(traits):
+    # inverse of traits_from_bits
+    return np.asarray(traits, dtype=np.int64) @ (1 << np.arange(5))
+
+
+def personality_matrix(personalities):
+    # (N x 5) bool matrix of a list of Personality, columns follow TRAITS
+    return traits_from_bits([p.bits for p in personalities])
+
+
+def appraise_weights(events, traits, context, params=None):
+    """
+    raw (not normalized) emotion weights of N events, same rules and order as
+    Event2Emotion.perceive -> apprise -> regulate
+    :param events: EventBatch
+    :param traits: (N x 5) bool array, see personality_matrix
+    :param context: str or array of str, 'individual' / 'social'
+    :param params: rule constants as a dict or a vector in PARAM_NAMES order, missing ones take PARAMS
+    :return: (N x 14) float array, columns follow EmotionSpace.emotions
+    """
+    if params is None:
+        p = PARAMS
+    elif isinstance(params, dict):
+        p = dict(PARAMS, **params)
+    else:
+        p = dict(zip(PARAM_NAMES, params))
+    n = len(events)
+    traits = np.asarray(traits, dtype=bool)
+    O, C, E, A, N = (traits[:, i] for i in range(5))
+    context = np.broadcast_to(np.asarray(context), (n,))
+    idx = EmotionSpace.index
+    weights = np.zeros((n, N_EMOTIONS), dtype=np.float64)
+
+    def change(emotion, mask, w):
+        weights[:, idx[emotion]] += np.where(mask, w, 0.0)
+
+    imp = events.importance
+    cond = events.condition
+    fam = events.familiarity
+    risk = events.risk
+    pos = imp > 0
+    neg = imp < 0
+    w = np.abs(imp * p['importance'])
+
+    # perceive
+    change('happy', pos & cond, w)
+    change('annoyed', pos & ~cond, w)
+    change('annoyed', neg, w)
+    change('annoyed', ~pos & ~neg, p['neutral'])
+
+    change('satisfied', ~cond & events.resource_available, p['resource'])
+    lack = ~cond & ~events.resource_available
+    change('sad', lack, p['resource'])
+    change('fear', lack, p['resource'])
+    change('angry', lack, p['resource'])
+
+    change('surprised', events.suddeness, p['suddeness'])
+
+    w_fam = np.abs(fam * p['familiarity'])
+    familiar = fam > 0
+    change('satisfied', cond & familiar, w_fam)
+    change('excited', cond & ~familiar, w_fam)
+    change('angry', ~cond & familiar, w_fam)
+    change('peaceful', ~cond & ~familiar, w_fam)
+
+    change('excited', cond & risk, p['risk'])
+    change('happy', cond & risk, p['risk'])
+    change('desperate', ~cond & risk, p['risk'])
+    change('sad', ~cond & risk, p['risk'])
+
+    # apprise
+    change('fear', risk & N, p['risk_trait'])
+    change('angry', risk & N, p['risk_trait'])
+    change('satisfied', risk & O, p['risk_trait'])
+
+    win = pos & cond
+    change('excited', win & C, w)
+    change('excited', win & N, 2*w)
+    change('pleasant', win & N, 2*w)
+    change('excited', win & O, w)
+    change('pleasant', win & O, w)
+    change('relaxed', win & A, w)
+
+    fail = pos & ~cond
+    change('annoyed', fail & C, 2*w)
+    change('angry', fail & N, 2*w)
+    change('fear', fail & N, 2*w)
+    change('satisfied', fail & O, w)
+    change('desperate', fail & ~O, 2*w)
+    change('relaxed', fail & A, w)
+
+    change('annoyed', ~pos & C, 2*w)
+    change('angry', ~pos & N, 2*w)
+    change('relaxed', ~pos & A, w)
+
+    individual = context == 'individual'
+    change('sad', individual & E, p['context'])
+    change('happy', individual & ~E, p['context'])
+
+    social = context == 'social'
+    change('happy', social & E, p['context'])
+    change('sad', social & ~E, p['context'])
+    change('annoyed', social & ~E, p['context'])
+    no_contribution = social & (events.contribution == 0)
+    change('angry', no_contribution & N, p['contribution'])
+    change('fear', no_contribution & N, p['contribution'])
+    change('relaxed', no_contribution & A, p['agreeable'])
+    change('peaceful', no_contribution & A, p['agreeable'])
+    contributed = social & (events.contribution != 0)
+    change('excited', contributed & N, p['contribution'])
+    change('pleasant', contributed & N, p['contribution'])
+
+    # regulate
+    tp = events.total_progress
+    change('happy', tp != 0, tp * p['progress'])
+    change('excited', tp == 1, p['completion'])
+    change('pleasant', tp == 1, p['completion'])
+    return weights
+
+
+def design_tensor(events, traits, context):
+    """
+    (N x K x 14) contribution of each rule constant, appraise_weights(params) == einsum('k,nke', params, tensor)
+    for non-negative params
+    """
+    eye = np.eye(len(PARAM_NAMES))
+    return np.stack([appraise_weights(events, traits, context, eye[k]) for k in range(len(PARAM_NAMES))], axis=1)
+
+
+def normalize_weights(weights):
+    # row-wise version of Event2Emotion.normalize_weights, summed in the same column order
+    total = np.zeros(len(weights), dtype=np.float64)
+    for j in range(weights.shape[1]):
+        total += weights[:, j]
+    return weights / total[:, None]
+
+
+def project(weights):
+    # (N x 14) normalized weights -> (N x 2) valence/arousal
+    return weights @ PROTOTYPES
+
+
+def batch_appraise(events, traits, context):
+    """
+    appraise N events for N personalities in one pass
+    :param events: EventBatch or list of Event
+    :param traits: (N x 5) bool array or list of Personality
+    :param context: str or array of str, 'individual' / 'social'
+    :return: (N x 14) normalized weights, (N x 2) valence/arousal
+    """
+    if not isinstance(events, EventBatch):
+        events = EventBatch.from_events(events)
+    if not isinstance(traits, np.ndarray):
+        traits = personality_matrix(traits)
+    weights = normalize_weights(appraise_weights(events, traits, context))
+    return weights, project(weights)
+
+
+def random_events(n, seed=None):
+    # random events and personalities for checks and benchmarks
+    rng = random.Random(seed)
+    events, personalities = [], []
+    for i in range(n):
+        personality = Personality(*(rng.random() < 0.5 for _ in TRAITS))
+        objects = EventObjects("cube", rng.random() < 0.5, rng.choice([-1, -0.5, 0, 0.5, 1, rng.uniform(-1, 1)]),
+                               rng.random() < 0.5, personality)
+        events.append(Event("event_{}".format(i), rng.choice([-1, -0.5, 0, 0.5, 1, rng.uniform(-1, 1)]),
+                            rng.random() < 0.5, rng.random() < 0.5, rng.random() < 0.5, objects,
+                            rng.choice([0, 0.5, 1, rng.random()]), rng.choice([0, 1, rng.random()])))
+        personalities.append(personality)
+    return events, personalities
+
+
+def scalar_appraise(event, personality, context):
+    # reference path: one Event2Emotion cycle
+    e2e = Event2Emotion(event, personality)
+    e2e.perceive()
+    e2e.apprise(context)
+    e2e.regulate()
+    e2e.calculate_emotion()
+    return e2e
+
+
+def check_against_scalar(n=2000, seed=0):
+    # the batch path must reproduce Event2Emotion on random events for both contexts
+    events, personalities = random_events(n, seed)
+    for context in ("individual", "social"):
+        weights, va = batch_appraise(events, personalities, context)
+        for i, (event, personality) in enumerate(zip(events, personalities)):
+            e2e = scalar_appraise(event, personality, context)
+            expected = [e2e.emotions_weight[e] for e in EmotionSpace.emotions]
+            assert np.array_equal(weights[i], expected), (context, i)
+            assert np.allclose(va[i], [e2e.emotion.x, e2e.emotion.y], rtol=0, atol=1e-12), (context, i)
+
+
+if __name__ == '__main__':
+    check_against_scalar()
+    print("batch appraisal matches Event2Emotion")
@@ -0,0 +1,167 @@
+import numpy as np
+
+from emotion_model import EmotionSpace
+from batch_appraisal import (EventBatch, PARAM_NAMES, DEFAULT_PARAMS, PROTOTYPES, design_tensor,
+                             personality_matrix)
+from emotion_classifier import nearest_prototype
+
+
+# Before normalization the weights are W_n = theta . F_n (see batch_appraisal.design_tensor), the model output is
+# va_n = (theta . H_n) / (theta . g_n) with H_n = F_n @ PROTOTYPES and g_n the weight sum per constant. Requiring
+# va_n == observed_n gives theta . (H_n - observed_n g_n) = 0, a linear system in theta. The output does not change
+# when theta is scaled, so one anchor constant keeps its value.
+
+
+class Corpus:
+    # an event corpus expanded once, reused by every fit and fold
+    def __init__(self, events, traits, context):
+        if not isinstance(events, EventBatch):
+            events = EventBatch.from_events(events)
+        if not isinstance(traits, np.ndarray):
+            traits = personality_matrix(traits)
+        tensor = design_tensor(events, traits, context)
+        self.H = tensor @ PROTOTYPES
+        self.g = tensor.sum(axis=2)
+
+    def __len__(self):
+        return len(self.g)
+
+    def subset(self, rows):
+        corpus = Corpus.__new__(Corpus)
+        corpus.H, corpus.g = self.H[rows], self.g[rows]
+        return corpus
+
+    def predict(self, params):
+        # (N x 2) valence/arousal under the given constants
+        return np.einsum("k,nkd->nd", params, self.H) / (self.g @ params)[:, None]
+
+
+def label_targets(labels):
+    # questionnaire labels (emotion names) -> prototype valence/arousal
+    return PROTOTYPES[[EmotionSpace.index[label] for label in labels]]
+
+
+class Calibration:
+    def __init__(self, params, rmse, label_accuracy=None):
+        self.params = params
+        self.rmse = rmse
+        self.label_accuracy = label_accuracy
+
+    def as_dict(self):
+        return dict(zip(PARAM_NAMES, map(float, self.params)))
+
+    def __repr__(self):
+        return "Calibration(rmse={:.4f}, label_accuracy={}, params={})".format(
+            self.rmse, self.label_accuracy, self.as_dict())
+
+
+def _free_solve(A, rhs, free, prior, ridge):
+    # least squares over the free constants, pulled towards the prior with weight ridge
+    k = len(free)
+    system = np.vstack([A[:, free], np.sqrt(ridge) * np.eye(k)])
+    target = np.concatenate([rhs, np.sqrt(ridge) * prior[free]])
+    return np.linalg.lstsq(system, target, rcond=None)[0]
+
+
+def linear_fit(corpus, targets, anchor="importance", ridge=1e-3, prior=DEFAULT_PARAMS):
+    """
+    solve theta . (H_n - y_n g_n) = 0 in the least-squares sense with non-negative constants
+    :param corpus: Corpus
+    :param targets: (N x 2) observed valence/arousal
+    :param anchor: constant that keeps its prior value and fixes the scale
+    """
+    targets = np.asarray(targets, dtype=np.float64)
+    # (2N x K) rows for valence and arousal
+    A = (corpus.H - targets[:, None, :] * corpus.g[:, :, None]).transpose(0, 2, 1).reshape(-1, len(PARAM_NAMES))
+    params = np.array(prior, dtype=np.float64)
+    j = PARAM_NAMES.index(anchor)
+    free = [k for k in range(len(PARAM_NAMES)) if k != j]
+    # active-set loop: constants that come out negative are fixed at 0
+    while free:
+        fixed = [k for k in range(len(params)) if k not in free]
+        rhs = -A[:, fixed] @ params[fixed]
+        solution = _free_solve(A, rhs, free, np.asarray(prior, dtype=np.float64), ridge)
+        if (solution >= 0).all():
+            params[free] = solution
+            break
+        negative = [k for k, value in zip(free, solution) if value < 0]
+        params[negative] = 0
+        free = [k for k in free if k not in negative]
+    return params
+
+
+def refine(corpus, targets, params, anchor="importance", iterations=20, damping=1e-3):
+    # Levenberg-Marquardt on the normalized model output, constants stay non-negative
+    targets = np.asarray(targets, dtype=np.float64)
+    params = params.copy()
+    free = np.array([k != PARAM_NAMES.index(anchor) for k in range(len(params))])
+
+    def loss(p):
+        return float(((corpus.predict(p) - targets) ** 2).sum())
+
+    current = loss(params)
+    for _ in range(iterations):
+        total = corpus.g @ params
+        pred = np.einsum("k,nkd->nd", params, corpus.H) / total[:, None]
+        # d pred_nd / d theta_k = (H_nkd - pred_nd g_nk) / total_n
+        J = (corpus.H - pred[:, None, :] * corpus.g[:, :, None]) / total[:, None, None]
+        J = J.transpose(0, 2, 1).reshape(-1, len(params))[:, free]
+        r = (pred - targets).ravel()
+        step = np.linalg.solve(J.T @ J + damping * np.eye(free.sum()), -J.T @ r)
+        candidate = params.copy()
+        candidate[free] = np.maximum(candidate[free] + step, 0)
+        new = loss(candidate)
+        if new < current:
+            params, current = candidate, new
+            damping /= 3
+        else:
+            damping *= 10
+    return params
+
+
+def evaluate(corpus, params, targets, labels=None):
+    pred = corpus.predict(params)
+    rmse = float(np.sqrt(((pred - targets) ** 2).mean()))
+    accuracy = None
+    if labels is not None:
+        codes = np.array([EmotionSpace.index[label] for label in labels])
+        accuracy = float((nearest_prototype(pred[:, 0], pred[:, 1]) == codes).mean())
+    return Calibration(params, rmse, accuracy)
+
+
+def fit(corpus, targets=None, labels=None, anchor="importance", ridge=1e-3, iterations=20):
+    """
+    fit the rule constants to questionnaire ratings
+    :param corpus: Corpus of the rated events
+    :param targets: (N x 2) rated valence/arousal
+    :param labels: rated emotion names, used as prototype targets when targets is None
+    :return: Calibration
+    """
+    if targets is None:
+        if labels is None:
+            raise ValueError("either targets or labels are required")
+        targets = label_targets(labels)
+    targets = np.asarray(targets, dtype=np.float64)
+    params = linear_fit(corpus, targets, anchor, ridge)
+    if iterations:
+        params = refine(corpus, targets, params, anchor, iterations)
+    return evaluate(corpus, params, targets, labels)
+
+
+def cross_validate(corpus, targets=None, labels=None, folds=5, seed=0, **kwargs):
+    """
+    k-fold cross-validation of fit
+    :return: list of (train Calibration, test Calibration) per fold
+    """
+    if targets is None:
+        targets = label_targets(labels)
+    targets = np.asarray(targets, dtype=np.float64)
+    order = np.random.default_rng(seed).permutation(len(corpus))
+    results = []
+    for test in np.array_split(order, folds):
+        train = np.setdiff1d(order, test)
+        train_labels = None if labels is None else [labels[i] for i in train]
+        test_labels = None if labels is None else [labels[i] for i in test]
+        trained = fit(corpus.subset(train), targets[train], train_labels, **kwargs)
+        results.append((trained, evaluate(corpus.subset(test), trained.params, targets[test], test_labels)))
+    return results
@@ -0,0 +1,619 @@
+"""
+In-process stand-in for the parts of the cozmo SDK used by tower_building_game and emotion_validation.
+Actions take configurable, seeded latencies and can fail at configurable rates. With virtual time the event loop
+jumps straight to the next timer, so a session runs as fast as the game logic allows.
+Select it with robot_backend.use("sim") or COZMO_BACKEND=sim.
+"""
+import asyncio
+import math
+import random
+import selectors
+import types
+
+
+# ---- configuration -------------------------------------------------------------------------------------------------
+
+# seconds per action, before jitter
+LATENCIES = {"play_anim_trigger": 2.5, "pickup_object": 6.0, "place_on_object": 6.0,
+             "place_object_on_ground_here": 3.0, "go_to_pose": 5.0, "go_to_object": 4.0, "turn_in_place": 1.5,
+             "drive_straight": None, "set_lift_height": 0.5, "set_head_angle": 0.3}
+# chance that one attempt of an action fails
+FAILURE_RATES = {"pickup_object": 0.2, "place_on_object": 0.1}
+
+
+class SimConfig:
+    def __init__(self, seed=0, latencies=None, failure_rates=None, jitter=0.1, drive_speed=100.0, virtual_time=True,
+                 discovery_time=4.0, face_delay=10.0, tap_probability=0.5, tap_delay=4.0,
+                 cube_positions=((300, -100, 0), (300, 0, 0), (300, 100, 0)),
+                 robot_positions=((0, -150, 0), (0, 150, 0)), unreachable=(), own_frames=True):
+        """
+        :param seed: seed of every random draw, one stream per robot
+        :param latencies: overrides of LATENCIES
+        :param failure_rates: overrides of FAILURE_RATES
+        :param jitter: latencies vary uniformly by +- this fraction
+        :param drive_speed: mm/s, actions that drive somewhere add the distance at this speed, None for fixed latencies
+        :param virtual_time: run on a VirtualTimeLoop
+        :param discovery_time: mean seconds until a looking-around robot sees a cube, exponentially distributed
+        :param face_delay: mean seconds from the first face wait until a person shows up, None for nobody
+        :param tap_probability: chance that a waited-for cube is tapped
+        :param tap_delay: mean seconds until the tap
+        :param cube_positions: (x, y, z) mm of the cubes, ids start at 1
+        :param robot_positions: start (x, y, z) mm of the robots in connection order
+        :param unreachable: (robot id, cube id) pairs, every pickup of that cube by that robot fails
+        :param own_frames: like real robots every robot reports poses relative to where it started, False puts all
+                           robots in one table frame
+        """
+        self.seed = seed
+        self.latencies = dict(LATENCIES, **(latencies or {}))
+        self.failure_rates = dict(FAILURE_RATES, **(failure_rates or {}))
+        self.jitter = jitter
+        self.drive_speed = drive_speed
+        self.virtual_time = virtual_time
+        self.discovery_time = discovery_time
+        self.face_delay = face_delay
+        self.tap_probability = tap_probability
+        self.tap_delay = tap_delay
+        self.cube_positions = cube_positions
+        self.robot_positions = robot_positions
+        self.unreachable = set(unreachable)
+        self.own_frames = own_frames
+
+
+def team_layout(num_robots, spacing=150):
+    # robots side by side at x=0 facing num_robots + 1 cubes in a row at x=300
+    def row(n, x):
+        return tuple((x, spacing * (i - (n - 1) / 2), 0) for i in range(n))
+    return {"robot_positions": row(num_robots, 0), "cube_positions": row(num_robots + 1, 300)}
+
+
+# ---- virtual time --------------------------------------------------------------------------------------------------
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    # instead of blocking until the next timer, advance the clock to it
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout=None):
+        if timeout is None or timeout <= 0:
+            return super().select(timeout)
+        events = super().select(0)
+        if not events:
+            self.clock.now += timeout
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    # event loop whose time() is a VirtualClock, real I/O (e.g. input()) still works
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else VirtualClock()
+        super().__init__(selector=_VirtualSelector(self.clock))
+
+    def time(self):
+        return self.clock.now
+
+
+# ---- cozmo.util ----------------------------------------------------------------------------------------------------
+
+class Angle:
+    def __init__(self, degrees=0.0):
+        self.degrees = degrees
+
+    @property
+    def radians(self):
+        return math.radians(self.degrees)
+
+    def __sub__(self, other):
+        return Angle(self.degrees - other.degrees)
+
+    def __repr__(self):
+        return "<Angle {:.1f} degrees>".format(self.degrees)
+
+
+class Distance:
+    def __init__(self, distance_mm):
+        self.distance_mm = distance_mm
+
+
+class Speed:
+    def __init__(self, speed_mmps):
+        self.speed_mmps = speed_mmps
+
+
+class Position:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+class Pose:
+    def __init__(self, x, y, z, angle_z=None):
+        self.position = Position(x, y, z)
+        self.rotation = types.SimpleNamespace(angle_z=angle_z if angle_z is not None else Angle(0))
+
+    def __sub__(self, other):
+        p, q = self.position, other.position
+        return Pose(p.x - q.x, p.y - q.y, p.z - q.z, self.rotation.angle_z - other.rotation.angle_z)
+
+    def __repr__(self):
+        p = self.position
+        return "<Pose ({:.0f}, {:.0f}, {:.0f}) {}>".format(p.x, p.y, p.z, self.rotation.angle_z)
+
+
+def degrees(value):
+    return Angle(value)
+
+
+def distance_mm(value):
+    return Distance(value)
+
+
+def speed_mmps(value):
+    return Speed(value)
+
+
+util = types.SimpleNamespace(Angle=Angle, Distance=Distance, Speed=Speed, Pose=Pose, Position=Position,
+                             degrees=degrees, distance_mm=distance_mm, speed_mmps=speed_mmps)
+
+
+# ---- enums and constants -------------------------------------------------------------------------------------------
+
+class _Names:
+    # any attribute is its own name, stands in for Triggers / BehaviorTypes
+    def __init__(self, kind):
+        self.kind = kind
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return name
+
+
+anim = types.SimpleNamespace(Triggers=_Names("Triggers"))
+behavior = types.SimpleNamespace(BehaviorTypes=_Names("BehaviorTypes"))
+lights = types.SimpleNamespace(blue_light="blue_light", off_light="off_light", green_light="green_light",
+                               red_light="red_light", white_light="white_light")
+
+
+class ConnectionError(Exception):
+    pass
+
+
+class ActionError(Exception):
+    # like cozmo.exceptions.ActionError
+    pass
+
+
+class RobotBusy(Exception):
+    # like cozmo.exceptions.RobotBusy: a second non-parallel action while one is running
+    pass
+
+
+exceptions = types.SimpleNamespace(ActionError=ActionError, RobotBusy=RobotBusy, ConnectionError=ConnectionError)
+
+
+def setup_basic_logging(*args, **kwargs):
+    pass
+
+
+# ---- world ---------------------------------------------------------------------------------------------------------
+
+class Cube:
+    # a physical cube on the table, its pose is in the table frame
+    def __init__(self, arena, cube_id, x, y, z):
+        self.arena = arena
+        self.cube_id = cube_id
+        self.pose = Pose(x, y, z)
+
+
+class LightCube:
+    # one robot's object for a physical cube, like the SDK every robot has its own, with poses in the robot's frame
+    def __init__(self, cube, world):
+        self.cube = cube
+        self.world = world
+        self.arena = cube.arena
+        self.cube_id = cube.cube_id
+        self.object_id = cube.cube_id
+        self.is_connected = True
+
+    @property
+    def pose(self):
+        p, (ox, oy) = self.cube.pose.position, self.world.robot.origin
+        return Pose(p.x - ox, p.y - oy, p.z, self.cube.pose.rotation.angle_z)
+
+    @pose.setter
+    def pose(self, pose):
+        p, (ox, oy) = pose.position, self.world.robot.origin
+        self.cube.pose = Pose(p.x + ox, p.y + oy, p.z, pose.rotation.angle_z)
+
+    async def wait_for_tap(self, timeout=None):
+        rng = self.arena.rng
+        delay = rng.expovariate(1 / self.arena.config.tap_delay) if self.arena.config.tap_delay else 0
+        if rng.random() < self.arena.config.tap_probability and (timeout is None or delay <= timeout):
+            await asyncio.sleep(delay)
+            return types.SimpleNamespace(obj=self, tap_count=1)
+        await asyncio.sleep(timeout if timeout is not None else delay)
+        raise asyncio.TimeoutError()
+
+    def __repr__(self):
+        return "<LightCube {} {}>".format(self.cube_id, self.pose)
+
+
+class EvtObjectObserved:
+    # like cozmo.objects.EvtObjectObserved, dispatched to World event handlers
+    def __init__(self, obj, pose):
+        self.obj = obj
+        self.pose = pose
+        self.updated = {"pose"}
+
+
+objects = types.SimpleNamespace(LightCube=LightCube, EvtObjectObserved=EvtObjectObserved)
+
+
+class Face:
+    def __init__(self, face_id):
+        self.face_id = face_id
+
+
+class Arena:
+    # the shared physical table: cubes and how often faces / taps happen
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.cubes = [Cube(self, i + 1, *position) for i, position in enumerate(config.cube_positions)]
+        self.robots = []
+        self.face_at = None
+
+    def face_time(self):
+        # loop time the person shows up, drawn at the first face wait
+        if self.face_at is None:
+            delay = self.rng.expovariate(1 / self.config.face_delay) if self.config.face_delay else math.inf
+            self.face_at = asyncio.get_event_loop().time() + delay
+        return self.face_at
+
+
+class World:
+    # one robot's view of the arena, cubes are seen while the robot is looking around
+    def __init__(self, robot):
+        self.robot = robot
+        self.arena = robot.arena
+        self.cubes = {cube.cube_id: LightCube(cube, self) for cube in self.arena.cubes}
+        self.observed = {}
+        self.handlers = []
+        self._changed = asyncio.Event()
+
+    def add_event_handler(self, event, f):
+        self.handlers.append((event, f))
+        return f
+
+    def remove_event_handler(self, event, f):
+        self.handlers.remove((event, f))
+
+    def dispatch_event(self, evt):
+        for event, f in list(self.handlers):
+            if isinstance(evt, event):
+                f(evt, obj=evt.obj, pose=evt.pose)
+
+    def observe(self, cube):
+        self.observed[cube.cube_id] = cube
+        self._changed.set()
+        self.dispatch_event(EvtObjectObserved(cube, cube.pose))
+
+    async def look_around(self):
+        # every cube not seen yet is seen after its own exponential delay
+        config = self.arena.config
+        unseen = [cube for cube_id, cube in self.cubes.items() if cube_id not in self.observed]
+        delays = sorted((self.robot.rng.expovariate(1 / config.discovery_time) if config.discovery_time else 0, i)
+                        for i in range(len(unseen)))
+        elapsed = 0.0
+        for delay, i in delays:
+            await asyncio.sleep(delay - elapsed)
+            elapsed = delay
+            self.observe(unseen[i])
+
+    async def wait_until_observe_num_objects(self, num, object_type=None, timeout=None, include_existing=True):
+        async def wait():
+            while len(self.observed) < num:
+                self._changed.clear()
+                await self._changed.wait()
+        await asyncio.wait_for(wait(), timeout)
+        return list(self.observed.values())[:num]
+
+    async def wait_for_observed_face(self, timeout=None, include_existing=True):
+        # every robot sees the person a moment after they show up
+        now = asyncio.get_event_loop().time()
+        delay = max(self.arena.face_time() - now, 0) + self.robot.rng.uniform(0, 0.3)
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        if math.isinf(delay):
+            # nobody ever shows up
+            await asyncio.get_event_loop().create_future()
+        await asyncio.sleep(delay)
+        return Face(1)
+
+    @property
+    def light_cubes(self):
+        return dict(self.cubes)
+
+
+# ---- robot ---------------------------------------------------------------------------------------------------------
+
+class Behavior:
+    def __init__(self, robot, behavior_type):
+        self.robot = robot
+        self.behavior_type = behavior_type
+        self.is_active = True
+        self.task = None
+        if behavior_type == "LookAroundInPlace":
+            self.task = asyncio.ensure_future(robot.world.look_around())
+
+    def stop(self):
+        self.is_active = False
+        if self.task is not None:
+            self.task.cancel()
+
+
+class Action:
+    # runs from creation, like an SDK action; wait_for_completed only waits for it
+    def __init__(self, robot, name, duration, attempts, succeeded, effect=None):
+        self.robot = robot
+        self.name = name
+        self.duration = duration
+        self.attempts = attempts
+        self.succeeded = succeeded
+        self.effect = effect
+        self.state = "running"
+        self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        try:
+            await asyncio.sleep(self.duration)
+        except asyncio.CancelledError:
+            self.state = "aborted"
+            raise
+        finally:
+            if self.robot.current_action is self:
+                self.robot.current_action = None
+        if self.succeeded and self.effect is not None:
+            self.effect()
+        self.state = "succeeded" if self.succeeded else "failed"
+
+    @property
+    def is_running(self):
+        return self.state == "running"
+
+    @property
+    def is_completed(self):
+        return self.state != "running"
+
+    @property
+    def has_succeeded(self):
+        return self.state == "succeeded"
+
+    @property
+    def has_failed(self):
+        return self.state in ("failed", "aborted")
+
+    def abort(self, log_abort_messages=False):
+        self.task.cancel()
+
+    async def wait_for_completed(self, timeout=None):
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task), timeout)
+        except asyncio.CancelledError:
+            if not self.task.cancelled():
+                raise
+        return self
+
+    def __repr__(self):
+        return "<Action {} robot {} {}>".format(self.name, self.robot.robot_id, self.state)
+
+
+class Robot:
+    drive_off_charger_on_connect = True
+
+    def __init__(self, arena, robot_id):
+        self.arena = arena
+        self.robot_id = robot_id
+        self.config = arena.config
+        self.rng = random.Random("{}:{}".format(arena.config.seed, robot_id))
+        x, y, z = arena.config.robot_positions[(robot_id - 1) % len(arena.config.robot_positions)]
+        # pose origin in the table frame, where the robot started
+        self.origin = (x, y) if arena.config.own_frames else (0, 0)
+        self.pose = Pose(x - self.origin[0], y - self.origin[1], z, angle_z=Angle(0))
+        self.head_angle = Angle(0)
+        self.lift_height = types.SimpleNamespace(distance_mm=32)
+        self.carrying_object = None
+        self.current_action = None
+        self.world = World(self)
+        self.backpack_lights = None
+
+    # helpers
+
+    def _latency(self, name, base=None):
+        base = self.config.latencies[name] if base is None else base
+        return max(0.0, base * (1 + self.rng.uniform(-self.config.jitter, self.config.jitter)))
+
+    def _travel(self, pose, offset=0.0):
+        # seconds to drive to pose, stopping offset mm short of it
+        if not self.config.drive_speed:
+            return 0.0
+        p, q = self.pose.position, pose.position
+        return max(0.0, math.hypot(p.x - q.x, p.y - q.y) - offset) / self.config.drive_speed
+
+    def _action(self, name, in_parallel=False, num_retries=0, base=None, effect=None, rate=None):
+        if not in_parallel and self.current_action is not None and self.current_action.is_running:
+            raise RobotBusy("robot {} is running {}".format(self.robot_id, self.current_action))
+        rate = self.config.failure_rates.get(name, 0) if rate is None else rate
+        duration, attempts, succeeded = 0.0, 0, False
+        while not succeeded and attempts <= num_retries:
+            duration += self._latency(name, base)
+            attempts += 1
+            succeeded = self.rng.random() >= rate
+        action = Action(self, name, duration, attempts, succeeded, effect)
+        if not in_parallel:
+            self.current_action = action
+        return action
+
+    def _own(self, obj):
+        # objects of another robot's world mean nothing to this robot
+        if obj.world is not self.world:
+            raise ValueError("cube {} is an object of robot {}, not of robot {}".format(
+                obj.cube_id, obj.world.robot.robot_id, self.robot_id))
+        return obj
+
+    def _move_to(self, x, y, angle=None):
+        self.pose = Pose(x, y, self.pose.position.z, angle if angle is not None else self.pose.rotation.angle_z)
+        if self.carrying_object is not None:
+            self.carrying_object.pose = Pose(x, y, self.pose.position.z + 60)
+
+    # SDK calls
+
+    def start_behavior(self, behavior_type):
+        return Behavior(self, behavior_type)
+
+    def play_anim_trigger(self, trigger, loop_count=1, in_parallel=False, num_retries=0, use_lift_safe=False,
+                          ignore_body_track=False, ignore_head_track=False, ignore_lift_track=False):
+        return self._action("play_anim_trigger", in_parallel, num_retries,
+                            base=self.config.latencies["play_anim_trigger"] * loop_count)
+
+    def turn_in_place(self, angle, in_parallel=False, num_retries=0, speed=None, accel=None, angle_tolerance=None,
+                      is_absolute=False):
+        target = angle.degrees if is_absolute else self.pose.rotation.angle_z.degrees + angle.degrees
+        effect = lambda: self._move_to(self.pose.position.x, self.pose.position.y, Angle(target))
+        return self._action("turn_in_place", in_parallel, num_retries, effect=effect)
+
+    def drive_straight(self, distance, speed, should_play_anim=True, in_parallel=False, num_retries=0):
+        base = self.config.latencies["drive_straight"]
+        if base is None:
+            base = abs(distance.distance_mm) / max(speed.speed_mmps, 1e-6)
+        heading = self.pose.rotation.angle_z.radians
+        effect = lambda: self._move_to(self.pose.position.x + distance.distance_mm * math.cos(heading),
+                                       self.pose.position.y + distance.distance_mm * math.sin(heading))
+        return self._action("drive_straight", in_parallel, num_retries, base=base, effect=effect)
+
+    def go_to_pose(self, pose, relative_to_robot=False, in_parallel=False, num_retries=0):
+        effect = lambda: self._move_to(pose.position.x, pose.position.y, pose.rotation.angle_z)
+        base = self.config.latencies["go_to_pose"] + self._travel(pose)
+        return self._action("go_to_pose", in_parallel, num_retries, base=base, effect=effect)
+
+    def go_to_object(self, target_object, distance_from_object, in_parallel=False, num_retries=0):
+        self._own(target_object)
+        def effect():
+            p = target_object.pose.position
+            self._move_to(p.x - distance_from_object.distance_mm, p.y)
+        base = (self.config.latencies["go_to_object"] +
+                self._travel(target_object.pose, distance_from_object.distance_mm))
+        return self._action("go_to_object", in_parallel, num_retries, base=base, effect=effect)
+
+    def pickup_object(self, obj, use_pre_dock_pose=True, in_parallel=False, num_retries=0):
+        self._own(obj)
+        def effect():
+            p = obj.pose.position
+            self._move_to(p.x - 50, p.y)
+            self.carrying_object = obj
+            obj.pose = Pose(self.pose.position.x, self.pose.position.y, self.pose.position.z + 60)
+        base = self.config.latencies["pickup_object"] + self._travel(obj.pose, 50)
+        rate = 1.0 if (self.robot_id, obj.cube_id) in self.config.unreachable else None
+        return self._action("pickup_object", in_parallel, num_retries, base=base, effect=effect, rate=rate)
+
+    def place_on_object(self, obj, use_pre_dock_pose=True, in_parallel=False, num_retries=0):
+        self._own(obj)
+        def effect():
+            carried, self.carrying_object = self.carrying_object, None
+            if carried is not None:
+                p = obj.pose.position
+                carried.pose = Pose(p.x, p.y, p.z + 44)
+        return self._action("place_on_object", in_parallel, num_retries, effect=effect)
+
+    def place_object_on_ground_here(self, obj, in_parallel=False, num_retries=0):
+        self._own(obj)
+        def effect():
+            if self.carrying_object is not None:
+                self.carrying_object.pose = Pose(self.pose.position.x + 50, self.pose.position.y, 0)
+                self.carrying_object = None
+        return self._action("place_object_on_ground_here", in_parallel, num_retries, effect=effect)
+
+    def set_lift_height(self, height, accel=10.0, max_speed=10.0, duration=0.0, in_parallel=False, num_retries=0):
+        effect = lambda: setattr(self, "lift_height", types.SimpleNamespace(ratio=height))
+        return self._action("set_lift_height", in_parallel, num_retries, base=duration or None, effect=effect)
+
+    def set_head_angle(self, angle, accel=10.0, max_speed=10.0, duration=0.0, warn_on_clamp=True,
+                       in_parallel=False, num_retries=0):
+        effect = lambda: setattr(self, "head_angle", angle)
+        return self._action("set_head_angle", in_parallel, num_retries, base=duration or None, effect=effect)
+
+    def set_all_backpack_lights(self, light):
+        self.backpack_lights = light
+
+    async def wait_for_all_actions_completed(self):
+        while self.current_action is not None and self.current_action.is_running:
+            await self.current_action.wait_for_completed()
+
+    def abort_all_actions(self, log_abort_messages=False):
+        if self.current_action is not None:
+            self.current_action.abort()
+
+
+robot = types.SimpleNamespace(Robot=Robot)
+
+
+# ---- connections ---------------------------------------------------------------------------------------------------
+
+_config = SimConfig()
+_arena = None
+
+
+def configure(config=None, **kwargs):
+    # start a fresh arena, e.g. configure(seed=3, face_delay=5)
+    global _config, _arena
+    _config = config if config is not None else SimConfig(**kwargs)
+    _arena = None
+    return _config
+
+
+def arena():
+    global _arena
+    if _arena is None:
+        _arena = Arena(_config)
+    return _arena
+
+
+def new_event_loop():
+    return VirtualTimeLoop() if _config.virtual_time else asyncio.new_event_loop()
+
+
+class Connection:
+    def __init__(self, loop, robot):
+        self.loop = loop
+        self.robot = robot
+
+    async def wait_for_robot(self, timeout=5):
+        return self.robot
+
+
+def connect_on_loop(loop):
+    table = arena()
+    sim_robot = Robot(table, len(table.robots) + 1)
+    table.robots.append(sim_robot)
+    return Connection(loop, sim_robot)
+
+
+def run_program(f, use_viewer=False, **kwargs):
+    # f must be a coroutine function taking the robot
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        connection = connect_on_loop(loop)
+        sim_robot = loop.run_until_complete(connection.wait_for_robot())
+        return loop.run_until_complete(f(sim_robot))
+    finally:
+        loop.close()
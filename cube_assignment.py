@@ -0,0 +1,161 @@
+import itertools
+import numpy as np
+
+
+def distance_matrix(a, b):
+    # (len(a) x len(b)) euclidean distances between two sets of (x, y) points
+    diff = np.asarray(a, dtype=np.float64)[:, None, :] - np.asarray(b, dtype=np.float64)[None, :, :]
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+
+def hungarian(cost):
+    """
+    minimum cost assignment of every row to a different column, shortest augmenting path version of the
+    Hungarian algorithm, O(n^2 m)
+    :param cost: (n x m) array with n <= m
+    :return: column of every row
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    if n > m:
+        raise ValueError("more rows ({}) than columns ({})".format(n, m))
+    # potentials and matching, index 0 is the virtual start column
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used
+            free[0] = False
+            slack = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = j0
+            candidates = np.flatnonzero(free)
+            j1 = candidates[np.argmin(min_slack[candidates])]
+            delta = min_slack[j1]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        # augment along the path
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    columns = np.empty(n, dtype=np.int64)
+    assigned = np.flatnonzero(match[1:])
+    columns[match[1:][assigned] - 1] = assigned
+    return columns
+
+
+class Assignment:
+    def __init__(self, pick, base, cost):
+        # pick[r] is the cube robot r picks up, -1 for none, base the cube the tower is built on, cost the total travel
+        # in mm
+        self.pick = pick
+        self.base = base
+        self.cost = cost
+
+    @property
+    def unassigned(self):
+        # robots left without a cube
+        return np.flatnonzero(self.pick < 0)
+
+    def __repr__(self):
+        return "Assignment(pick={}, base={}, cost={:.1f})".format(self.pick.tolist(), self.base, self.cost)
+
+
+def solve_partial(cost):
+    """
+    hungarian() where np.inf marks pairs that cannot be used and rows may outnumber columns
+    :return: column of every row, as many rows as possible get a usable one, the others -1
+    """
+    n, m = cost.shape
+    finite = np.isfinite(cost)
+    # costs more than every usable pair together, so one more usable pair always wins
+    penalty = cost[finite].sum() + 1.0
+    padded = np.where(finite, cost, penalty)
+    if n <= m:
+        columns = hungarian(padded)
+    else:
+        columns = np.full(n, -1, dtype=np.int64)
+        columns[hungarian(padded.T)] = np.arange(m)
+    usable = columns >= 0
+    usable[usable] = finite[np.flatnonzero(usable), columns[usable]]
+    return np.where(usable, columns, -1)
+
+
+def assign_cubes(robot_to_cube, cube_to_cube, base=None, seed=0):
+    """
+    pick-up cube for every robot and the base cube, minimizing robot -> pick-up cube plus pick-up cube -> base travel
+    :param robot_to_cube: (R x C) distances, row r in robot r's own frame, np.inf for the cubes robot r has not seen
+    :param cube_to_cube: (C x C) distances between the cubes, np.inf where unknown
+    :param base: index of a fixed base cube, None tries every cube
+    :param seed: orders cubes and robots, decides between assignments of equal cost
+    :return: Assignment, a robot only gets a cube it has seen and only when it has seen the base as well. with fewer
+             than R + 1 cubes or some cubes unseen the assignment leaves as few robots without a cube as possible
+    """
+    robot_to_cube = np.asarray(robot_to_cube, dtype=np.float64)
+    cube_to_cube = np.asarray(cube_to_cube, dtype=np.float64)
+    n_robots, n_cubes = robot_to_cube.shape
+    if n_cubes < 2:
+        raise ValueError("a tower needs at least 2 cubes, got {}".format(n_cubes))
+    rng = np.random.default_rng(seed)
+    robot_order = rng.permutation(n_robots)
+    cube_order = rng.permutation(n_cubes)
+    best, best_key = None, None
+    for b in ([base] if base is not None else cube_order):
+        others = cube_order[cube_order != b]
+        cost = robot_to_cube[np.ix_(robot_order, others)] + cube_to_cube[others, b][None, :]
+        # a robot that has not seen the base cannot build on it
+        cost[~np.isfinite(robot_to_cube[robot_order, b])] = np.inf
+        columns = solve_partial(cost)
+        usable = columns >= 0
+        total = float(cost[np.flatnonzero(usable), columns[usable]].sum())
+        key = (-int(usable.sum()), total)
+        if best_key is None or key < best_key:
+            pick = np.empty(n_robots, dtype=np.int64)
+            pick[robot_order] = np.where(usable, others[columns], -1)
+            best, best_key = Assignment(pick, int(b), total), key
+    return best
+
+
+def brute_force(robot_to_cube, cube_to_cube):
+    # exhaustive reference for small problems
+    n_robots, n_cubes = robot_to_cube.shape
+    best = None
+    for b in range(n_cubes):
+        others = [c for c in range(n_cubes) if c != b]
+        for pick in itertools.permutations(others, n_robots):
+            total = sum(robot_to_cube[r, c] + cube_to_cube[c, b] for r, c in enumerate(pick))
+            if best is None or total < best.cost:
+                best = Assignment(np.array(pick), b, total)
+    return best
+
+
+def check_against_brute_force(trials=200, seed=0):
+    # optimal cost on random small layouts
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        n_robots = int(rng.integers(1, 4))
+        cubes = rng.uniform(0, 500, (n_robots + int(rng.integers(1, 3)), 2))
+        robots = rng.uniform(0, 500, (n_robots, 2))
+        found = assign_cubes(distance_matrix(robots, cubes), distance_matrix(cubes, cubes))
+        expected = brute_force(distance_matrix(robots, cubes), distance_matrix(cubes, cubes))
+        if not np.isclose(found.cost, expected.cost):
+            raise AssertionError("{} != {}".format(found, expected))
+    return trials
+
+
+if __name__ == "__main__":
+    print("{} random layouts optimal".format(check_against_brute_force()))
@@ -0,0 +1,234 @@
+import sys
+import threading
+import time
+import traceback
+import numpy as np
+
+from emotion_model import Emotion
+from emotion_batch import EmotionBatch
+
+
+class DecayHandle:
+    # one registered decay, returned by DecayScheduler.register
+    def __init__(self, scheduler, emotion, target, nt, on_done=None):
+        self.scheduler = scheduler
+        self.emotion = emotion
+        self.target = target
+        self.nt = nt
+        self.ticks_left = nt
+        # same per-tick change as Emotion.decay_emotion
+        self.dx = (target.x - emotion.x) / nt
+        self.dy = (target.y - emotion.y) / nt
+        self.callbacks = [] if on_done is None else [on_done]
+        self.cancelled = False
+        self.finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def add_done_callback(self, callback):
+        # callback(handle) runs in the scheduler thread when the decay reaches its target
+        self.callbacks.append(callback)
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def __repr__(self):
+        state = "cancelled" if self.cancelled else "done" if self.done else "{} ticks left".format(self.ticks_left)
+        return "DecayHandle({}, {})".format(self.emotion.get_emotion(), state)
+
+
+class DecayScheduler:
+    # one thread advances every registered emotion by one vectorized step per tick
+    def __init__(self, tick=1.0):
+        """
+        :param tick: float, seconds between two steps
+        """
+        self.tick = tick
+        self.handles = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.dirty = True
+        self.x = self.y = self.dx = self.dy = self.left = None
+
+    def __len__(self):
+        return len(self.handles)
+
+    def register(self, emotion, target, nt=20, on_done=None, start=True):
+        """
+        decay emotion towards target in nt ticks
+        :param emotion: Emotion, updated in place
+        :param target: EmotionVector or Emotion
+        :param on_done: callable(handle) or None
+        :param start: start the scheduler thread if it is not running
+        :return: DecayHandle
+        """
+        handle = DecayHandle(self, emotion, target, nt, on_done)
+        with self.lock:
+            self.handles.append(handle)
+            self.dirty = True
+        if start:
+            self.start()
+        return handle
+
+    def cancel(self, handle):
+        with self.lock:
+            if handle in self.handles:
+                self.handles.remove(handle)
+                self.dirty = True
+        handle.cancelled = True
+        handle.finished.set()
+
+    def set_tick(self, tick):
+        # takes effect from the next tick
+        self.tick = tick
+
+    def _rebuild(self):
+        # the emotions and tick counts are written back every step, so the handles hold the current state
+        self.x = np.array([h.emotion.x for h in self.handles], dtype=np.float64)
+        self.y = np.array([h.emotion.y for h in self.handles], dtype=np.float64)
+        self.dx = np.array([h.dx for h in self.handles], dtype=np.float64)
+        self.dy = np.array([h.dy for h in self.handles], dtype=np.float64)
+        self.left = np.array([h.ticks_left for h in self.handles], dtype=np.int64)
+        self.dirty = False
+
+    def step(self):
+        # advance every registered emotion by one tick, returns the handles that finished
+        with self.lock:
+            if not self.handles:
+                return []
+            if self.dirty:
+                self._rebuild()
+            self.x += self.dx
+            self.y += self.dy
+            self.left -= 1
+            batch = EmotionBatch.from_xy(self.x, self.y)
+            for i, handle in enumerate(self.handles):
+                emo = handle.emotion
+                emo.x, emo.y = float(batch.x[i]), float(batch.y[i])
+                emo.strength, emo.angle = float(batch.strength[i]), float(batch.angle[i])
+                handle.ticks_left = int(self.left[i])
+            done = self.left <= 0
+            finished = []
+            if done.any():
+                finished = [h for h, d in zip(self.handles, done) if d]
+                self.handles = [h for h, d in zip(self.handles, done) if not d]
+                self.dirty = True
+        for handle in finished:
+            handle.finished.set()
+            for callback in handle.callbacks:
+                # a failing callback must not stop the tick loop shared by every other decay
+                try:
+                    callback(handle)
+                except Exception:
+                    print("decay callback {!r} failed for {!r}".format(callback, handle), file=sys.stderr)
+                    traceback.print_exc()
+        return finished
+
+    def run_until_idle(self, max_ticks=None):
+        # step without sleeping until nothing is registered, for virtual-time runs
+        ticks = 0
+        while self.handles and (max_ticks is None or ticks < max_ticks):
+            self.step()
+            ticks += 1
+        return ticks
+
+    def _run(self):
+        while not self.stopping.wait(self.tick):
+            self.step()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._run, name="decay-scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        # stop the thread, registered decays are kept and continue after start()
+        self.stopping.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+
+class LazyDecay:
+    # decay described by (start, target, t0, nt), evaluated on demand without any background work
+    __slots__ = ("x0", "y0", "dx", "dy", "t0", "nt", "tick")
+
+    def __init__(self, start, target, nt=20, t0=None, tick=1.0):
+        """
+        :param start: EmotionVector or Emotion at t0
+        :param target: EmotionVector or Emotion reached after nt ticks
+        :param t0: float, start time on the time.monotonic clock, now if None
+        :param tick: float, seconds per step, decay_emotion uses 1
+        """
+        self.x0, self.y0 = start.x, start.y
+        self.dx = (target.x - start.x) / nt
+        self.dy = (target.y - start.y) / nt
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.nt = nt
+        self.tick = tick
+
+    def steps(self, t=None):
+        # number of ticks elapsed at time t, clamped to [0, nt]
+        t = time.monotonic() if t is None else t
+        return min(max(int((t - self.t0) // self.tick), 0), self.nt)
+
+    def xy_at(self, t=None):
+        k = self.steps(t)
+        return self.x0 + k * self.dx, self.y0 + k * self.dy
+
+    def at(self, t=None):
+        # the emotion decay_emotion would show at time t
+        x, y = self.xy_at(t)
+        return Emotion(x=x, y=y)
+
+    def done(self, t=None):
+        return self.steps(t) >= self.nt
+
+
+class LazyDecayBatch:
+    # many lazy decays in parallel arrays, sampled as an EmotionBatch
+    def __init__(self, x0, y0, target_x, target_y, nt=20, t0=None, tick=1.0):
+        self.x0 = np.asarray(x0, dtype=np.float64)
+        self.y0 = np.asarray(y0, dtype=np.float64)
+        self.nt = np.broadcast_to(np.asarray(nt, dtype=np.int64), self.x0.shape)
+        self.dx = (np.asarray(target_x, dtype=np.float64) - self.x0) / self.nt
+        self.dy = (np.asarray(target_y, dtype=np.float64) - self.y0) / self.nt
+        t0 = time.monotonic() if t0 is None else t0
+        self.t0 = np.broadcast_to(np.asarray(t0, dtype=np.float64), self.x0.shape)
+        self.tick = tick
+
+    def __len__(self):
+        return len(self.x0)
+
+    def steps(self, t=None):
+        t = time.monotonic() if t is None else t
+        return np.clip(np.floor_divide(t - self.t0, self.tick), 0, self.nt)
+
+    def at(self, t=None):
+        k = self.steps(t)
+        return EmotionBatch.from_xy(self.x0 + k * self.dx, self.y0 + k * self.dy)
+
+    def done(self, t=None):
+        return self.steps(t) >= self.nt
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    # shared scheduler used by Emotion.start_decay, ticking once per second like decay_emotion
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = DecayScheduler(tick=1.0)
+        return _default
@@ -0,0 +1,180 @@
+import math
+import numpy as np
+
+from emotion_model import Emotion, EmotionSpace
+
+
+# emotion names indexed by label code, -1 is used for points outside the mapper
+LABELS = np.array(EmotionSpace.emotions, dtype=object)
+
+
+def _label_table():
+    # label code for (area, mapper key + 1), area 1-4, mapper key -1-3 as in Emotion.get_area_emo
+    table = np.full((5, 5), -1, dtype=np.int16)
+    for area, keys in EmotionSpace.mapper.items():
+        for key, emo in keys.items():
+            table[area, key + 1] = EmotionSpace.index[emo]
+    return table
+
+
+LABEL_TABLE = _label_table()
+
+
+def areas(angle):
+    # vectorized Emotion.set_area
+    return np.clip(np.ceil(np.asarray(angle) / 360 * 4), 1, 4).astype(np.intp)
+
+
+def label_codes(x, y, angle, threshold=math.pow(2, 0.5)/2):
+    # vectorized Emotion.get_area_emo, returns indices into EmotionSpace.emotions
+    abs_x = np.abs(x)
+    abs_y = np.abs(y)
+    key = (abs_x <= threshold).astype(np.intp) - (abs_y > 0.9) + 2 * (abs_y <= threshold)
+    return LABEL_TABLE[areas(angle), key + 1]
+
+
+class EmotionBatch:
+    # struct-of-arrays of many emotions, x: valence, y: arousal, strength, angle in degrees [0, 360)
+    def __init__(self, x, y, strength, angle):
+        self.x = x
+        self.y = y
+        self.strength = strength
+        self.angle = angle
+
+    @classmethod
+    def from_xy(cls, x, y):
+        # from x, y, to calculate strength, angle
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        strength = np.hypot(x, y)
+        angle = np.degrees(np.arctan2(y, x))
+        # arctan2 is in (-180, 180], fold the lower half plane to (180, 360)
+        angle[angle < 0] += 360
+        # -0.0 in y gives 180 for the negative x axis, keep the origin at 0 like set_xy
+        angle[strength == 0] = 0
+        return cls(x, y, strength, angle)
+
+    @classmethod
+    def from_strength_angle(cls, strength, angle):
+        # from strength, angle to x, y
+        strength = np.ascontiguousarray(strength, dtype=np.float64)
+        angle = np.ascontiguousarray(angle, dtype=np.float64)
+        radians = np.radians(angle)
+        return cls(strength * np.cos(radians), strength * np.sin(radians), strength, angle)
+
+    @classmethod
+    def from_emotions(cls, emotions):
+        return cls.from_xy([e.x for e in emotions], [e.y for e in emotions])
+
+    @classmethod
+    def from_valence_arousal(cls, va):
+        # from the (N x 2) output of batch_appraisal.batch_appraise
+        va = np.asarray(va, dtype=np.float64)
+        return cls.from_xy(va[:, 0], va[:, 1])
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, item):
+        # an int gives an Emotion, a slice or mask gives an EmotionBatch (a view for slices)
+        if isinstance(item, (int, np.integer)):
+            return self.emotion(item)
+        return EmotionBatch(self.x[item], self.y[item], self.strength[item], self.angle[item])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.emotion(i)
+
+    def emotion(self, i):
+        # a single Emotion from the stored values, no trigonometry is redone
+        emo = Emotion()
+        emo.x = float(self.x[i])
+        emo.y = float(self.y[i])
+        emo.strength = float(self.strength[i])
+        emo.angle = float(self.angle[i])
+        return emo
+
+    def areas(self):
+        return areas(self.angle)
+
+    def label_codes(self, threshold=math.pow(2, 0.5)/2):
+        return label_codes(self.x, self.y, self.angle, threshold)
+
+    def labels(self, threshold=math.pow(2, 0.5)/2):
+        # emotion names, None where get_area_emo has no label
+        codes = self.label_codes(threshold)
+        names = LABELS[codes]
+        names[codes < 0] = None
+        return names
+
+    def __add__(self, other):
+        return EmotionBatch.from_xy(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other):
+        return EmotionBatch.from_xy(self.x - other.x, self.y - other.y)
+
+    def __repr__(self):
+        return "EmotionBatch of {} emotions".format(len(self))
+
+
+def _as_xy(emotions):
+    # (N x 2) array from an array, an EmotionBatch or a list of Emotion
+    if isinstance(emotions, EmotionBatch):
+        return np.stack([emotions.x, emotions.y], axis=1)
+    if isinstance(emotions, np.ndarray):
+        return emotions.reshape(-1, 2).astype(np.float64, copy=False)
+    return np.array([[e.x, e.y] for e in emotions], dtype=np.float64).reshape(-1, 2)
+
+
+class Trajectory:
+    # (agents x steps x 2) valence/arousal, labels are only computed when asked for
+    def __init__(self, xy):
+        self.xy = xy
+        self._codes = None
+
+    @property
+    def shape(self):
+        return self.xy.shape[:2]
+
+    def batch(self):
+        # all points as one flat EmotionBatch, agent major
+        return EmotionBatch.from_xy(self.xy[..., 0].ravel(), self.xy[..., 1].ravel())
+
+    def label_codes(self):
+        if self._codes is None:
+            self._codes = self.batch().label_codes().reshape(self.shape)
+        return self._codes
+
+    def labels(self):
+        codes = self.label_codes()
+        names = LABELS[codes]
+        names[codes < 0] = None
+        return names
+
+    def emotion(self, agent, step):
+        return Emotion(x=float(self.xy[agent, step, 0]), y=float(self.xy[agent, step, 1]))
+
+
+def transition_trajectories(start, target, nt, steps=None):
+    """
+    Emotion.change_emotion(target, nt, t) for many agents and all t at once
+    :param start: (agents x 2) array, EmotionBatch or list of Emotion
+    :param target: same as start, one target per agent
+    :param nt: number of steps of the transition
+    :param steps: the t values, 1..nt by default
+    :return: Trajectory of shape (agents x steps)
+    """
+    start = _as_xy(start)
+    delta = _as_xy(target) - start
+    steps = np.arange(1, nt + 1) if steps is None else np.asarray(steps)
+    return Trajectory(start[:, None, :] + delta[:, None, :] * steps[None, :, None] / nt)
+
+
+def iter_transition(start, target, nt, steps=None):
+    # generator variant of transition_trajectories, yields one EmotionBatch over all agents per step
+    start = _as_xy(start)
+    delta = _as_xy(target) - start
+    steps = range(1, nt + 1) if steps is None else steps
+    for t in steps:
+        xy = start + delta * t / nt
+        yield EmotionBatch.from_xy(xy[:, 0], xy[:, 1])
@@ -0,0 +1,199 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+from emotion_model import EmotionVector, Emotion, Event2Emotion
+from batch_appraisal import batch_appraise, random_events
+from emotion_batch import EmotionBatch
+
+
+# Every case is setup(n, seed) -> (calls, items): calls is a list of zero-argument callables, the time of each call
+# is one latency sample and all calls together process `items` items.
+CASES = {}
+SCALES = (1, 100, 10_000, 1_000_000)
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class VirtualClock:
+    # stands in for time.sleep so decays run without waiting
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def time(self):
+        return self.now
+
+
+def _random_xy(n, seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(n)]
+
+
+@case("emotion_vector_construct")
+def _emotion_vector_construct(n, seed):
+    points = _random_xy(n, seed)
+    return [lambda x=x, y=y: EmotionVector(x=x, y=y) for x, y in points], n
+
+
+@case("emotion_construct")
+def _emotion_construct(n, seed):
+    points = _random_xy(n, seed)
+    return [lambda x=x, y=y: Emotion(strength=(x * x + y * y) ** 0.5, angle=(x + 1) * 180) for x, y in points], n
+
+
+@case("emotion_arithmetic")
+def _emotion_arithmetic(n, seed):
+    emotions = [Emotion(x=x, y=y) for x, y in _random_xy(n + 1, seed)]
+    return [lambda a=a, b=b: (a + b) - b for a, b in zip(emotions, emotions[1:])], n
+
+
+def _cycle(event, personality, context):
+    e2e = Event2Emotion(event, personality)
+    e2e.perceive()
+    e2e.apprise(context)
+    e2e.regulate()
+    e2e.calculate_emotion()
+    return e2e
+
+
+@case("event2emotion_individual")
+def _event2emotion_individual(n, seed):
+    events, personalities = random_events(n, seed)
+    return [lambda e=e, p=p: _cycle(e, p, "individual") for e, p in zip(events, personalities)], n
+
+
+@case("event2emotion_social")
+def _event2emotion_social(n, seed):
+    events, personalities = random_events(n, seed)
+    return [lambda e=e, p=p: _cycle(e, p, "social") for e, p in zip(events, personalities)], n
+
+
+@case("get_area_emo")
+def _get_area_emo(n, seed):
+    emotions = [Emotion(x=x * 0.7, y=y * 0.7) for x, y in _random_xy(n, seed)]
+    return [emo.get_area_emo for emo in emotions], n
+
+
+@case("decay_emotion")
+def _decay_emotion(n, seed):
+    # the blocking decay path, one 20-step decay per item, on a virtual clock
+    clock = VirtualClock()
+    pairs = [(Emotion(x=x, y=y), Emotion(x=-y, y=x)) for x, y in _random_xy(n, seed)]
+    return [lambda e=e, t=t: e.decay_emotion(t, nt=20, sleep=clock.sleep, verbose=False) for e, t in pairs], n
+
+
+@case("batch_appraise_social")
+def _batch_appraise_social(n, seed):
+    events, personalities = random_events(n, seed)
+    return [lambda: batch_appraise(events, personalities, "social")], n
+
+
+@case("emotion_batch_labels")
+def _emotion_batch_labels(n, seed):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(-0.7, 0.7, n), rng.uniform(-0.7, 0.7, n)
+    return [lambda: EmotionBatch.from_xy(x, y).label_codes()], n
+
+
+def run_case(name, n, seed=0, repeat=3, memory=True):
+    """
+    time one case at one scale
+    :return: dict with throughput (items/s), latency percentiles (s per call) and peak memory (bytes)
+    """
+    setup = CASES[name]
+    totals, latencies = [], []
+    for _ in range(repeat):
+        calls, items = setup(n, seed)
+        samples = np.empty(len(calls))
+        for i, call in enumerate(calls):
+            start = time.perf_counter()
+            call()
+            samples[i] = time.perf_counter() - start
+        totals.append(samples.sum())
+        latencies.append(samples)
+    latencies = np.concatenate(latencies)
+    result = {"case": name, "n": n, "repeat": repeat,
+              "seconds": float(np.median(totals)),
+              "throughput": float(items / np.median(totals)) if np.median(totals) > 0 else float("inf"),
+              "latency": {"p50": float(np.percentile(latencies, 50)), "p90": float(np.percentile(latencies, 90)),
+                          "p99": float(np.percentile(latencies, 99)), "max": float(latencies.max())}}
+    if memory:
+        # separate pass, tracemalloc slows the calls down. the inputs are built before tracing starts, so the peak is
+        # what the calls allocate
+        calls, _ = setup(n, seed)
+        tracemalloc.start()
+        for call in calls:
+            call()
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names=None, scales=SCALES, seed=0, repeat=3, memory=True, log=print):
+    names = list(CASES) if names is None else names
+    results = []
+    for name in names:
+        for n in scales:
+            result = run_case(name, n, seed, repeat, memory)
+            results.append(result)
+            if log:
+                log("{:<26} n={:<8} {:>14.1f} items/s  p50 {:.2e}s  p99 {:.2e}s  peak {}".format(
+                    name, n, result["throughput"], result["latency"]["p50"], result["latency"]["p99"],
+                    result.get("peak_memory", "-")))
+    return {"commit": _commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+            "numpy": np.__version__, "platform": platform.platform(), "seed": seed, "results": results}
+
+
+def compare(old, new):
+    # throughput ratio new / old for every (case, n) present in both reports
+    before = {(r["case"], r["n"]): r["throughput"] for r in old["results"]}
+    return {"{} n={}".format(*key): r["throughput"] / before[key]
+            for r in new["results"] for key in [(r["case"], r["n"])] if key in before and before[key]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the emotion model hot paths")
+    parser.add_argument("--cases", nargs="*", choices=sorted(CASES), help="default: all cases")
+    parser.add_argument("--scales", nargs="*", type=int, default=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="JSON report path, default bench_<commit>.json")
+    parser.add_argument("--compare", help="earlier JSON report to compare throughput against")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.cases, args.scales, args.seed, args.repeat, not args.no_memory)
+    output = args.output or "bench_{}.json".format(report["commit"] or "local")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("saved", output)
+    if args.compare:
+        with open(args.compare) as f:
+            for key, ratio in compare(json.load(f), report).items():
+                print("{:<40} x{:.2f}".format(key, ratio))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import numpy as np
+
+from emotion_model import EmotionSpace
+from batch_appraisal import PROTOTYPES
+from emotion_batch import EmotionBatch, LABELS, label_codes
+
+
+# grid cells whose samples disagree are labeled exactly
+AMBIGUOUS = -2
+CHUNK = 1 << 16
+
+
+def _polar(x, y):
+    # strength and angle in [0, 360) the way EmotionBatch.from_xy computes them
+    strength = np.hypot(x, y)
+    angle = np.degrees(np.arctan2(y, x))
+    angle = np.where(angle < 0, angle + 360, angle)
+    return strength, np.where(strength == 0, 0.0, angle)
+
+
+def nearest_prototype(x, y):
+    # index (into EmotionSpace.emotions) of the closest init_emotions() prototype of every point
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    codes = np.empty(len(x), dtype=np.int16)
+    for start in range(0, len(x), CHUNK):
+        stop = start + CHUNK
+        dist = (x[start:stop, None] - PROTOTYPES[:, 0]) ** 2 + (y[start:stop, None] - PROTOTYPES[:, 1]) ** 2
+        codes[start:stop] = dist.argmin(axis=1)
+    return codes
+
+
+def area_thresholds(x, y):
+    # compatibility labels of Emotion.get_area_emo, -1 where it has no label
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    return label_codes(x, y, _polar(x, y)[1])
+
+
+EXACT = {"prototype": nearest_prototype, "threshold": area_thresholds}
+
+
+class EmotionClassifier:
+    # label points through a precomputed (strength, angle) grid, falling back to the exact rule near boundaries
+    def __init__(self, mode="prototype", strength_bins=512, angle_bins=2048, max_strength=1.5):
+        """
+        :param mode: 'prototype' for the nearest init_emotions() prototype, 'threshold' for get_area_emo
+        :param strength_bins: grid resolution along strength
+        :param angle_bins: grid resolution along angle
+        :param max_strength: points further from the origin use the exact rule
+        """
+        if mode not in EXACT:
+            raise ValueError("unknown mode {}, expected one of {}".format(mode, sorted(EXACT)))
+        self.mode = mode
+        self.exact = EXACT[mode]
+        self.strength_bins = strength_bins
+        self.angle_bins = angle_bins
+        self.max_strength = max_strength
+        self.strength_step = max_strength / strength_bins
+        self.angle_step = 360 / angle_bins
+        self.grid = self._build_grid()
+
+    def _build_grid(self):
+        # sample every cell at its corners, edge midpoints and center, cells with one label are stored directly
+        fractions = np.array([0.0, 0.5, 1.0])
+        s = (np.arange(self.strength_bins)[:, None] + fractions) * self.strength_step
+        a = np.radians((np.arange(self.angle_bins)[:, None] + fractions) * self.angle_step)
+        # (strength bins, angle bins, 3, 3) sample points
+        strength = s[:, None, :, None]
+        angle = a[None, :, None, :]
+        shape = (self.strength_bins, self.angle_bins, 3, 3)
+        x = np.broadcast_to(strength * np.cos(angle), shape)
+        y = np.broadcast_to(strength * np.sin(angle), shape)
+        samples = self.exact(x, y).reshape(self.strength_bins, self.angle_bins, 9)
+        center = samples[:, :, 4]
+        uniform = (samples == center[:, :, None]).all(axis=2)
+        return np.where(uniform, center, AMBIGUOUS).astype(np.int16)
+
+    def classify(self, x, y):
+        # label codes of many points
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        strength, angle = _polar(x, y)
+        return self.classify_polar(strength, angle, x, y)
+
+    def classify_polar(self, strength, angle, x=None, y=None):
+        # label codes from strength and angle, x and y are recomputed for the fallback if not given
+        strength = np.asarray(strength, dtype=np.float64)
+        angle = np.asarray(angle, dtype=np.float64)
+        # floor, not truncation toward zero: angles just below 0 belong to the last bin, negative strengths to no row
+        i = np.floor(strength / self.strength_step).astype(np.intp)
+        j = np.floor((angle % 360) / self.angle_step).astype(np.intp) % self.angle_bins
+        inside = (i >= 0) & (i < self.strength_bins)
+        codes = self.grid[np.where(inside, i, 0), j]
+        codes = np.where(inside, codes, AMBIGUOUS)
+        fallback = codes == AMBIGUOUS
+        if fallback.any():
+            if x is None:
+                radians = np.radians(angle[fallback])
+                fx, fy = strength[fallback] * np.cos(radians), strength[fallback] * np.sin(radians)
+            else:
+                fx, fy = x[fallback], y[fallback]
+            codes[fallback] = self.exact(fx, fy)
+        return codes
+
+    def classify_batch(self, batch):
+        # label codes of an EmotionBatch
+        return self.classify_polar(batch.strength, batch.angle, batch.x, batch.y)
+
+    def labels(self, x, y):
+        codes = self.classify(x, y)
+        names = LABELS[codes]
+        names[codes < 0] = None
+        return names
+
+    def label(self, emotion):
+        # label of one Emotion or EmotionVector
+        code = int(self.classify_polar(np.array([emotion.strength]), np.array([emotion.angle]),
+                                       np.array([emotion.x]), np.array([emotion.y]))[0])
+        return EmotionSpace.emotions[code] if code >= 0 else None
+
+    def fallback_fraction(self):
+        # share of grid cells that need the exact rule
+        return float((self.grid == AMBIGUOUS).mean())
+
+
+_classifiers = {}
+
+
+def default_classifier(mode="prototype"):
+    # one shared classifier per mode, the grid is built on first use
+    if mode not in _classifiers:
+        _classifiers[mode] = EmotionClassifier(mode)
+    return _classifiers[mode]
+
+
+def classify(emotions, mode="prototype"):
+    # label codes of an EmotionBatch or a list of Emotion
+    if not isinstance(emotions, EmotionBatch):
+        emotions = EmotionBatch.from_emotions(emotions)
+    return default_classifier(mode).classify_batch(emotions)
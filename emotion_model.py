@@ -1,12 +1,12 @@
 import math
 import numpy as np
-import threading
-import multiprocessing
 import time
 
 
 class EmotionVector:
     # emotion vector represent emotion
+    __slots__ = ("x", "y", "strength", "angle")
+
     def __init__(self, **kwargs):
         if "strength" in kwargs and "angle" in kwargs:
             # use strength, angle to represent emotion 
@@ -33,6 +33,10 @@ class EmotionVector:
         self.x = x
         self.y = y
         self.strength = math.sqrt(math.pow(x, 2)+math.pow(y, 2))
+        if self.strength == 0:
+            # the origin has no direction
+            self.angle = 0
+            return
         angle_aux = math.degrees(math.asin(y/self.strength))
         if angle_aux >= 0:
             if x >= 0:
@@ -66,24 +70,29 @@ class EmotionSpace:
               3: {0: "calm", 1: "tired", 2: "desperate", 3: "sad"},
               4: {0: "calm", 1: "relaxed", 2: "peaceful", 3: "satisfied"}}
     emotions = ["surprised", "excited", "pleasant", "happy",
-                "angry", "fear", "annoyed", "clam", "tired",
+                "angry", "fear", "annoyed", "calm", "tired",
                 "desperate", "sad", "relaxed", "peaceful", "satisfied"]
+    # column of each emotion in weight vectors / matrices
+    index = {emo: i for i, emo in enumerate(emotions)}
 
 
 class Emotion(EmotionVector):
     # emotion transition
+    __slots__ = ("area", "decay_handle", "decay_stop")
+    mapper = EmotionSpace.mapper
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.mapper = EmotionSpace.mapper
         self.area = None
-        self.decay_thread = None
+        self.decay_handle = None
         self.decay_stop = False
 
     def get_emotion(self):
         return self.get_area_emo()
 
     def set_area(self):
-        self.area = list(filter(lambda area: (self.angle/360*4) <= area, range(1, 5)))[0]
+        # first quadrant (1-4) whose upper bound is not below the angle
+        self.area = max(1, math.ceil(self.angle/360*4))
 
     def get_area_emo(self, threshold=math.pow(2, 0.5)/2):
         self.set_area()
@@ -97,34 +106,50 @@ class Emotion(EmotionVector):
 
     def change_emotion(self, target, nt, t):
         assert isinstance(target, EmotionVector) or isinstance(target, Emotion)
-        delta = target - self
-        curr_x, curr_y = np.array([self.x, self.y]) + np.array([delta.x, delta.y]) * t / nt
+        # for many agents or whole transitions use emotion_batch.transition_trajectories
+        curr_x = self.x + (target.x - self.x) * t / nt
+        curr_y = self.y + (target.y - self.y) * t / nt
         curr = Emotion()
         curr.set_xy(curr_x, curr_y)
         return curr
     
-    def decay_emotion(self, target, nt=20):
+    def decay_emotion(self, target, nt=20, sleep=time.sleep, verbose=True):
+        # blocking decay, pass a virtual clock's sleep to run without waiting
         delta = target - self
         t_change = np.array([delta.x, delta.y]) / nt
         
         t_count = 0
-        print(self)
+        if verbose:
+            print(self)
         while not self.decay_stop:
             if t_count >= nt:
                 break
-            time.sleep(1)
+            sleep(1)
             self.set_xy(self.x+t_change[0], self.y+t_change[1])
-            print(self)
+            if verbose:
+                print(self)
             t_count += 1
     
-    def start_decay(self, target, nt=20):
-        self.decay_thread = threading.Thread(target=self.decay_emotion, args=[target, nt])
-        self.decay_thread.start()
+    def start_decay(self, target, nt=20, scheduler=None, on_done=None):
+        # decay towards target in nt ticks of a shared DecayScheduler instead of a thread per emotion
+        from decay_scheduler import default_scheduler
+        if self.decay_handle is not None:
+            self.decay_handle.cancel()
+        self.decay_stop = False
+        scheduler = scheduler if scheduler is not None else default_scheduler()
+        self.decay_handle = scheduler.register(self, target, nt, on_done)
+        return self.decay_handle
     
+    def lazy_decay(self, target, nt=20, t0=None, tick=1.0):
+        # decay evaluated on demand with LazyDecay.at(t), this emotion is left unchanged
+        from decay_scheduler import LazyDecay
+        return LazyDecay(self, target, nt, t0, tick)
+
     def stop_decay(self):
         self.decay_stop = True
-        self.decay_thread.join()
-#         self.decay_process.join()
+        if self.decay_handle is not None:
+            self.decay_handle.cancel()
+            self.decay_handle = None
         
     def __add__(self, other):
         new = Emotion()
@@ -142,7 +167,10 @@ class Emotion(EmotionVector):
     
 
 class Event:
-    # variables of an event
+    # variables of an event, see event_records for the fixed binary layout of event logs
+    __slots__ = ("name", "importance", "condition", "resource_available", "suddeness", "event_objects",
+                 "total_progress", "contribution")
+
     def __init__(self, name, importance, condition, resource, suddeness, event_objects, total_progress, contribution):
         """
         :param name: str
@@ -161,15 +189,11 @@ class Event:
         self.total_progress = total_progress
         self.contribution = contribution
 
-    def __setattr__(self, key, value):
-        self.__dict__[key] = value
-
-    def __getattr__(self, item):
-        return self.__dict__[item]
-
 
 class EventObjects:
     # variables of event objects in an event
+    __slots__ = ("name", "living", "familiarity", "risk", "agent_personality")
+
     def __init__(self, name, living, familiarity, risk=False, agent_personality=None):
         """
         :param name: str
@@ -196,18 +220,26 @@ class EventObjects:
                   self.agent_personality.N):
                 self.risk = True
 
-    def __setattr__(self, key, value):
-        self.__dict__[key] = value
-
-    def __getattr__(self, item):
-        return self.__dict__[item]
-    
     def __repr__(self):
         return "name: {0}, living_object: {1}, familiar {2}, risk: {3}".format(
             self.name, self.living, self.familiarity, self.risk)
 
 
+def _trait(bit):
+    # one OCEAN trait of Personality.bits as a bool attribute
+    def get(self):
+        return bool(self.bits >> bit & 1)
+
+    def set(self, value):
+        self.bits = self.bits & ~(1 << bit) | int(bool(value)) << bit
+    return property(get, set)
+
+
 class Personality:
+    # OCEAN traits packed into 5 bits, O is bit 0 and N is bit 4
+    __slots__ = ("bits",)
+    TRAITS = ("O", "C", "E", "A", "N")
+
     def __init__(self, O, C, E, A, N):
         """
 
@@ -217,17 +249,28 @@ class Personality:
         :param A: bool
         :param N: bool
         """
-        self.O = O
-        self.C = C
-        self.E = E
-        self.A = A
-        self.N = N
+        self.bits = int(bool(O)) | int(bool(C)) << 1 | int(bool(E)) << 2 | int(bool(A)) << 3 | int(bool(N)) << 4
 
-    def __setattr__(self, key, value):
-        self.__dict__[key] = value
+    O = _trait(0)
+    C = _trait(1)
+    E = _trait(2)
+    A = _trait(3)
+    N = _trait(4)
 
-    def __getattr__(self, item):
-        return self.__dict__[item]
+    @classmethod
+    def from_bits(cls, bits):
+        personality = cls.__new__(cls)
+        personality.bits = int(bits) & 0b11111
+        return personality
+
+    def __eq__(self, other):
+        return isinstance(other, Personality) and self.bits == other.bits
+
+    def __hash__(self):
+        return self.bits
+
+    def __repr__(self):
+        return "Personality({})".format(", ".join("{}={}".format(t, getattr(self, t)) for t in self.TRAITS))
 
 
 class Event2Emotion:
@@ -242,7 +285,8 @@ class Event2Emotion:
         self.mood = (0.25, 0)
         self.current_emotion = self.mood
     
-    def init_emotions(self):
+    @staticmethod
+    def init_emotions():
         # boundaries of each emotions in the emotional Coordinate System        
         emotion_boundaries = {"happy": {"x": 0.25, "y": 0.25},
         "satisfied": {"x": 0.25, "y": -0.25},
@@ -407,12 +451,13 @@ class Event2Emotion:
             y += self.emotions_weight[e]*self.default_emotions[e]["y"]
         self.emotion = Emotion(**{"x": x, "y": y})
         
-    # def mood_regulation(self):
-    #     x, y = self.emotion.x, self.emotion.y
-    #     x = 0.8*x + 0.2*self.mood[0]
-    #     y = 0.8*y + 0.2*self.mood[1]
-    #     self.emotion = Emotion(**{"x": x, "y": y})
-    #     self.current_emotion = Emotion(**{"x": x, "y": y})
+    def mood_regulation(self, mood_weight=0.2):
+        # blend the mood into the calculated emotion, agent_appraiser.AgentAppraiser keeps the mood across events
+        x, y = self.emotion.x, self.emotion.y
+        x = (1-mood_weight)*x + mood_weight*self.mood[0]
+        y = (1-mood_weight)*y + mood_weight*self.mood[1]
+        self.emotion = Emotion(**{"x": x, "y": y})
+        self.current_emotion = self.emotion
         
     def get_emotion(self):
         return self.emotion
\ No newline at end of file
@@ -1,19 +1,19 @@
-import cozmo
 import asyncio
 import sys
-import random
-from cozmo.util import distance_mm, degrees
-import time
 
-def ready(robot):
-	# set robot to ready position
-    robot.set_lift_height(0, in_parallel=True)
-    robot.set_head_angle(degrees(0), in_parallel=True)
-    robot.wait_for_all_actions_completed()
+import robot_backend
 
-def cozmo_program(robot: cozmo.robot.Robot):
- 	# display expressions one by one
-    anim_dict = {"happy": cozmo.anim.Triggers.ComeHere_AlreadyHere, 
+# the real SDK or the simulator, see robot_backend
+cozmo = robot_backend.sdk()
+degrees = cozmo.util.degrees
+
+# randomly shuffled list is kept
+anim_list = ['sad', 'tired', 'relaxed', 'bored', 'suprised', 'fear', 'pleasant', 'annoyed_s', 'angry', 'desperate', 'happy', 'annoyed_h', 'excited']
+
+
+def expression_triggers():
+    # animation trigger of every expression
+    return {"happy": cozmo.anim.Triggers.ComeHere_AlreadyHere,
     "annoyed_s": cozmo.anim.Triggers.CodeLabUnhappy,
     "annoyed_h": cozmo.anim.Triggers.CodeLabFrustrated,
     "excited": cozmo.anim.Triggers.CubePounceWinSession,
@@ -27,24 +27,118 @@ def cozmo_program(robot: cozmo.robot.Robot):
     "relaxed": cozmo.anim.Triggers.CodeLabWin,
     "pleasant": cozmo.anim.Triggers.BuildPyramidThirdBlockUpright}
 
-    # randomly shuffled list is kept
-    anim_list = ['sad', 'tired', 'relaxed', 'bored', 'suprised', 'fear', 'pleasant', 'annoyed_s', 'angry', 'desperate', 'happy', 'annoyed_h', 'excited']
-    
-
-    i = 0
-    while True:
-        start = input("Please press enter to perform next expression: ")
-        if start == "q":
-            break
-        ready(robot)
-        if start == "r":
-            i -= 1
-            print(str(anim_list[i]))
-            robot.play_anim_trigger(anim_dict[anim_list[i]], ignore_lift_track=True).wait_for_completed()
-        else:
-            print(str(anim_list[i]))
-            robot.play_anim_trigger(anim_dict[anim_list[i]], ignore_lift_track=True).wait_for_completed()
-        i += 1
-
-
-cozmo.run_program(cozmo_program)
\ No newline at end of file
+
+async def ready_async(robot):
+    # set robot to ready position, lift and head move together
+    lift = robot.set_lift_height(0, in_parallel=True)
+    head = robot.set_head_angle(degrees(0), in_parallel=True)
+    await asyncio.gather(lift.wait_for_completed(), head.wait_for_completed())
+
+
+async def read_line(prompt):
+    # input() in a worker thread so the event loop keeps running animations and resets
+    return await asyncio.get_running_loop().run_in_executor(None, input, prompt)
+
+
+class ExpressionTiming:
+    def __init__(self, name, pressed, started, ended):
+        self.name = name
+        self.pressed = pressed
+        self.started = started
+        self.ended = ended
+
+    @property
+    def press_to_start(self):
+        return self.started - self.pressed
+
+    @property
+    def start_to_end(self):
+        return self.ended - self.started
+
+    def __repr__(self):
+        return "{}: press->start {:.3f}s, start->end {:.3f}s".format(self.name, self.press_to_start, self.start_to_end)
+
+
+class ExpressionPlayer:
+    # plays expressions one by one, the ready pose is restored in the background after every animation
+    def __init__(self, robot, triggers=None, order=None, clock=None):
+        """
+        :param clock: time source of the timings, default the running loop's time() so virtual time is reported as well
+        """
+        self.robot = robot
+        self.triggers = triggers if triggers is not None else expression_triggers()
+        self.order = list(order if order is not None else anim_list)
+        self.clock = clock
+        self.timings = []
+        self.reset_task = None
+
+    def now(self):
+        return self.clock() if self.clock is not None else asyncio.get_running_loop().time()
+
+    def reset(self):
+        # start moving to the ready pose without waiting for it
+        self.reset_task = asyncio.ensure_future(ready_async(self.robot))
+
+    async def play(self, name, pressed=None):
+        pressed = self.now() if pressed is None else pressed
+        if self.reset_task is not None:
+            await self.reset_task
+        print(name)
+        action = self.robot.play_anim_trigger(self.triggers[name], ignore_lift_track=True)
+        # start is when the animation was dispatched to the robot
+        started = self.now()
+        await action.wait_for_completed()
+        ended = self.now()
+        self.reset()
+        timing = ExpressionTiming(name, pressed, started, ended)
+        self.timings.append(timing)
+        return timing
+
+    async def interactive(self, read=read_line):
+        # enter plays the next expression, r replays the previous one, q quits
+        self.reset()
+        i = 0
+        while i < len(self.order):
+            start = await read("Please press enter to perform next expression: ")
+            pressed = self.now()
+            if start == "q":
+                break
+            if start == "r":
+                i = max(i - 1, 0)
+            await self.play(self.order[i], pressed)
+            i += 1
+        if self.reset_task is not None:
+            await self.reset_task
+
+    async def scripted(self, script):
+        """
+        timed sequence without keyboard input
+        :param script: list of (delay in seconds after the previous expression ended, expression name)
+        """
+        self.reset()
+        for delay, name in script:
+            await asyncio.sleep(delay)
+            await self.play(name)
+        if self.reset_task is not None:
+            await self.reset_task
+
+    def summary(self):
+        for timing in self.timings:
+            print(timing)
+        if self.timings:
+            print("mean press->start {:.3f}s".format(sum(t.press_to_start for t in self.timings) / len(self.timings)))
+
+
+async def cozmo_program(robot: cozmo.robot.Robot):
+ 	# display expressions one by one
+    player = ExpressionPlayer(robot)
+    if "--script" in sys.argv:
+        # the shuffled order, one expression every 3 seconds
+        await player.scripted([(3, name) for name in anim_list])
+    else:
+        await player.interactive()
+    player.summary()
+
+
+if __name__ == '__main__':
+    cozmo.run_program(cozmo_program)
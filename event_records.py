@@ -0,0 +1,73 @@
+import numpy as np
+
+from emotion_model import Event, EventObjects, Personality
+from batch_appraisal import EventBatch, traits_from_bits
+
+
+# fixed 34-byte little-endian layout of one event, names are not stored
+RECORD_DTYPE = np.dtype([("importance", "<f8"),
+                         ("familiarity", "<f8"),
+                         ("total_progress", "<f8"),
+                         ("contribution", "<f8"),
+                         # bit 0 condition, 1 resource_available, 2 suddeness, 3 risk, 4 living
+                         ("flags", "u1"),
+                         # Personality.bits of the appraising agent
+                         ("personality", "u1")])
+CONDITION, RESOURCE, SUDDENESS, RISK, LIVING = (1 << i for i in range(5))
+
+
+def to_records(events, personalities=None):
+    """
+    pack events into a structured array
+    :param events: list of Event
+    :param personalities: list of Personality, defaults to the agent_personality of the event objects
+    :return: RECORD_DTYPE array
+    """
+    records = np.zeros(len(events), dtype=RECORD_DTYPE)
+    for i, event in enumerate(events):
+        objects = event.event_objects
+        personality = personalities[i] if personalities is not None else objects.agent_personality
+        records[i] = (event.importance, objects.familiarity, event.total_progress, event.contribution,
+                      bool(event.condition) * CONDITION | bool(event.resource_available) * RESOURCE |
+                      bool(event.suddeness) * SUDDENESS | bool(objects.risk) * RISK | bool(objects.living) * LIVING,
+                      personality.bits if personality is not None else 0)
+    return records
+
+
+def to_event(record, name=""):
+    # unpack one record into Event, EventObjects and Personality
+    flags = int(record["flags"])
+    personality = Personality.from_bits(record["personality"])
+    objects = EventObjects(name, bool(flags & LIVING), float(record["familiarity"]), bool(flags & RISK))
+    # the stored risk already includes living_agent_risk, attach the personality afterwards
+    objects.agent_personality = personality
+    event = Event(name, float(record["importance"]), bool(flags & CONDITION), bool(flags & RESOURCE),
+                  bool(flags & SUDDENESS), objects, float(record["total_progress"]), float(record["contribution"]))
+    return event, personality
+
+
+def to_batch(records):
+    # EventBatch and (N x 5) trait matrix straight from the columns, without building objects
+    flags = records["flags"]
+    events = EventBatch(importance=records["importance"],
+                        condition=flags & CONDITION != 0,
+                        resource_available=flags & RESOURCE != 0,
+                        suddeness=flags & SUDDENESS != 0,
+                        familiarity=records["familiarity"],
+                        risk=flags & RISK != 0,
+                        total_progress=records["total_progress"],
+                        contribution=records["contribution"])
+    return events, traits_from_bits(records["personality"])
+
+
+def append_records(path, records):
+    # append raw records to a log file
+    with open(path, "ab") as f:
+        f.write(np.ascontiguousarray(records, dtype=RECORD_DTYPE).tobytes())
+
+
+def read_records(path, mmap=True):
+    # whole log as a RECORD_DTYPE array, memory-mapped read-only by default
+    if mmap:
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+    return np.fromfile(path, dtype=RECORD_DTYPE)
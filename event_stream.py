@@ -0,0 +1,166 @@
+import argparse
+import csv
+import json
+import queue
+import threading
+from itertools import islice
+
+from emotion_model import Event, EventObjects, Personality
+from batch_appraisal import EventBatch, batch_appraise, personality_matrix
+from emotion_batch import EmotionBatch, LABELS
+
+
+# Columns of an event log row. Personality is given either as O, C, E, A, N columns or as "personality" bits.
+# Missing optional columns take these defaults.
+DEFAULTS = {"name": "", "object": "", "living": False, "risk": False, "total_progress": 0, "contribution": 0,
+            "context": "social"}
+OUTPUT_FIELDS = ("name", "context", "x", "y", "strength", "angle", "label")
+TRUE = {"1", "true", "t", "yes", "y"}
+
+
+def _bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE
+    return bool(value)
+
+
+def read_jsonl(path):
+    # one dict per non-empty line
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_log(path):
+    # pick the reader from the file extension
+    return read_csv(path) if path.endswith(".csv") else read_jsonl(path)
+
+
+def row_to_event(row):
+    """
+    build the model records of one log row
+    :return: Event, Personality, context
+    """
+    get = lambda key: row[key] if row.get(key) not in (None, "") else DEFAULTS[key]
+    if row.get("personality") not in (None, ""):
+        personality = Personality.from_bits(int(row["personality"]))
+    else:
+        personality = Personality(*(_bool(row[t]) for t in Personality.TRAITS))
+    objects = EventObjects(get("object"), _bool(get("living")), float(row["familiarity"]), _bool(get("risk")),
+                           personality)
+    event = Event(get("name"), float(row["importance"]), _bool(row["condition"]), _bool(row["resource"]),
+                  _bool(row["suddeness"]), objects, float(get("total_progress")), float(get("contribution")))
+    return event, personality, get("context")
+
+
+def batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bounded_prefetch(iterable, maxsize=4):
+    # read ahead in a thread, the reader blocks once maxsize items are waiting so memory stays bounded
+    items = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(e)
+        else:
+            put(done)
+
+    thread = threading.Thread(target=produce, name="event-stream-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def appraise_stream(rows, batch_size=1024, prefetch=0):
+    """
+    lazily appraise log rows, yielding one result dict per row
+    :param rows: iterable of dict, e.g. read_log(path)
+    :param batch_size: rows appraised together, memory is bounded by batch_size * (prefetch + 2)
+    :param prefetch: batches parsed ahead in a reader thread, 0 parses inline
+    """
+    parsed = (list(map(row_to_event, chunk)) for chunk in batches(rows, batch_size))
+    if prefetch:
+        parsed = bounded_prefetch(parsed, prefetch)
+    for chunk in parsed:
+        events, personalities, contexts = zip(*chunk)
+        _, va = batch_appraise(EventBatch.from_events(events), personality_matrix(personalities), list(contexts))
+        emotions = EmotionBatch.from_valence_arousal(va)
+        codes = emotions.label_codes()
+        for i, event in enumerate(events):
+            yield {"name": event.name, "context": contexts[i], "x": float(emotions.x[i]), "y": float(emotions.y[i]),
+                   "strength": float(emotions.strength[i]), "angle": float(emotions.angle[i]),
+                   "label": LABELS[codes[i]] if codes[i] >= 0 else None}
+
+
+def write_jsonl(results, path, flush_every=1024):
+    n = 0
+    with open(path, "w") as f:
+        for n, result in enumerate(results, 1):
+            f.write(json.dumps(result) + "\n")
+            if n % flush_every == 0:
+                f.flush()
+    return n
+
+
+def write_csv(results, path, flush_every=1024):
+    n = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        for n, result in enumerate(results, 1):
+            writer.writerow(result)
+            if n % flush_every == 0:
+                f.flush()
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="appraise a JSONL/CSV event log into a JSONL/CSV emotion log")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--prefetch", type=int, default=2, help="batches parsed ahead, 0 disables the reader thread")
+    args = parser.parse_args(argv)
+    results = appraise_stream(read_log(args.input), args.batch_size, args.prefetch)
+    write = write_csv if args.output.endswith(".csv") else write_jsonl
+    print("appraised", write(results, args.output, args.batch_size), "events")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+
+
+class FaceWatcher:
+    # every robot watches for a face at once, the first detection ends the search of all of them
+    def __init__(self, robots, poll=2):
+        """
+        :param robots: robot id -> robot
+        :param poll: timeout of a single wait_for_observed_face call in seconds
+        """
+        self.robots = robots
+        self.poll = poll
+        self.found = asyncio.Event()
+        self.face = None
+        self.seen_by = None
+        self.started = None
+        self.detected = None
+        self.watches = []
+        self.scans = set()
+        # scans cancelled because of a detection, any other cancellation is passed on
+        self.stopped = set()
+
+    def start(self):
+        self.started = asyncio.get_event_loop().time()
+        self.watches = [asyncio.ensure_future(self._watch(aid, robot)) for aid, robot in self.robots.items()]
+        return self
+
+    async def _watch(self, aid, robot):
+        while not self.found.is_set():
+            try:
+                face = await robot.world.wait_for_observed_face(timeout=self.poll)
+            except asyncio.TimeoutError:
+                continue
+            self._found(aid, face)
+
+    def _found(self, aid, face):
+        if self.found.is_set():
+            return
+        self.face, self.seen_by = face, aid
+        self.detected = asyncio.get_event_loop().time()
+        self.found.set()
+        # the remaining scan motions are pointless now
+        for scan in list(self.scans):
+            self.stopped.add(scan)
+            scan.cancel()
+
+    async def scan(self, motions):
+        """
+        run a scan coroutine until it is done or any robot sees a face
+        :param motions: coroutine moving a robot around, its actions should be awaited with action_executor.act()
+        :return: the face, None if the scan ended without one
+        """
+        if self.found.is_set():
+            motions.close()
+            return self.face
+        task = asyncio.ensure_future(motions)
+        self.scans.add(task)
+        try:
+            await task
+        except asyncio.CancelledError:
+            # a detection stopped the scan, unless our caller has been cancelled as well. cancelling() is there from
+            # python 3.11 on
+            caller = asyncio.current_task()
+            if task not in self.stopped or getattr(caller, "cancelling", lambda: 0)():
+                raise
+        finally:
+            self.scans.discard(task)
+            self.stopped.discard(task)
+        return self.face
+
+    async def wait(self, timeout=None):
+        # the face once seen, None after timeout seconds without one
+        try:
+            await asyncio.wait_for(self.found.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.face
+
+    @property
+    def latency(self):
+        # seconds from start to the first detection
+        return None if self.detected is None else self.detected - self.started
+
+    async def stop(self):
+        for task in self.watches + list(self.scans):
+            task.cancel()
+        await asyncio.gather(*self.watches, *self.scans, return_exceptions=True)
+        self.watches = []
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
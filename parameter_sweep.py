@@ -0,0 +1,107 @@
+import itertools
+import numpy as np
+
+from emotion_model import EmotionSpace
+from batch_appraisal import (EventBatch, PARAMS, PARAM_NAMES, DEFAULT_PARAMS, PROTOTYPES, design_tensor,
+                             personality_matrix)
+from emotion_batch import EmotionBatch
+
+
+# label distribution columns: the 14 emotions, then points get_area_emo cannot label
+LABEL_COLUMNS = tuple(EmotionSpace.emotions) + (None,)
+
+
+def grid(**values):
+    """
+    full grid over the given constants, the others keep their PARAMS value
+    e.g. grid(importance=[5, 10, 20], completion=[50, 100])
+    :return: (P x K) parameter sets in PARAM_NAMES order
+    """
+    unknown = set(values) - set(PARAMS)
+    if unknown:
+        raise ValueError("unknown parameters {}".format(sorted(unknown)))
+    names = list(values)
+    sets = np.tile(DEFAULT_PARAMS, (int(np.prod([len(v) for v in values.values()])), 1))
+    for row, combo in enumerate(itertools.product(*values.values())):
+        for name, value in zip(names, combo):
+            sets[row, PARAM_NAMES.index(name)] = value
+    return sets
+
+
+def random_sample(n, seed=None, **bounds):
+    """
+    n parameter sets drawn uniformly within bounds, e.g. random_sample(1000, risk=(0, 10))
+    :return: (n x K) parameter sets in PARAM_NAMES order
+    """
+    unknown = set(bounds) - set(PARAMS)
+    if unknown:
+        raise ValueError("unknown parameters {}".format(sorted(unknown)))
+    rng = np.random.default_rng(seed)
+    sets = np.tile(DEFAULT_PARAMS, (n, 1))
+    for name, (lo, hi) in bounds.items():
+        sets[:, PARAM_NAMES.index(name)] = rng.uniform(lo, hi, n)
+    return sets
+
+
+class SweepResult:
+    def __init__(self, params, label_counts, mean_va):
+        # (P x K) parameter sets, (P x 15) label counts, (P x 2) mean valence/arousal, NaN when no event has an emotion
+        self.params = params
+        self.label_counts = label_counts
+        self.mean_va = mean_va
+
+    def distributions(self):
+        # label shares per parameter set
+        return self.label_counts / self.label_counts.sum(axis=1, keepdims=True)
+
+    def rows(self):
+        dist = self.distributions()
+        return [{"params": dict(zip(PARAM_NAMES, map(float, params))),
+                 "labels": {str(label): float(share) for label, share in zip(LABEL_COLUMNS, dist[i]) if share},
+                 "mean_valence": float(self.mean_va[i, 0]), "mean_arousal": float(self.mean_va[i, 1])}
+                for i, params in enumerate(self.params)]
+
+
+def sweep(events, traits, context, param_sets, chunk_size=256, classifier=None):
+    """
+    appraise a fixed event corpus under many parameter sets
+    :param events: EventBatch or list of Event
+    :param traits: (N x 5) bool array or list of Personality
+    :param context: str or array of str
+    :param param_sets: (P x K) array, see grid / random_sample
+    :param chunk_size: parameter sets evaluated per vectorized step
+    :param classifier: emotion_classifier.EmotionClassifier, default get_area_emo labels
+    :return: SweepResult
+    """
+    if not isinstance(events, EventBatch):
+        events = EventBatch.from_events(events)
+    if not isinstance(traits, np.ndarray):
+        traits = personality_matrix(traits)
+    param_sets = np.atleast_2d(np.asarray(param_sets, dtype=np.float64))
+    # the corpus is expanded once, every parameter set is then a contraction over the constants
+    tensor = design_tensor(events, traits, context)
+    n, n_labels = len(events), len(LABEL_COLUMNS)
+    counts = np.zeros((len(param_sets), n_labels), dtype=np.int64)
+    mean_va = np.zeros((len(param_sets), 2))
+    for start in range(0, len(param_sets), chunk_size):
+        chunk = param_sets[start:start + chunk_size]
+        weights = np.einsum("pk,nke->pne", chunk, tensor)
+        totals = weights.sum(axis=2, keepdims=True)
+        # a parameter set can zero every weight of an event, the event then has no emotion: it counts as unlabeled
+        # and is left out of the mean
+        empty = totals[..., 0] <= 0
+        weights /= np.where(empty[..., None], 1.0, totals)
+        va = weights @ PROTOTYPES
+        felt = (~empty).sum(axis=1)[:, None]
+        mean_va[start:start + len(chunk)] = np.divide(np.where(empty[..., None], 0.0, va).sum(axis=1), felt,
+                                                      out=np.full((len(chunk), 2), np.nan), where=felt > 0)
+        if classifier is None:
+            codes = EmotionBatch.from_xy(va[..., 0].ravel(), va[..., 1].ravel()).label_codes()
+        else:
+            codes = classifier.classify(va[..., 0], va[..., 1])
+        # unlabeled (-1) goes to the last column
+        codes = np.where((codes < 0) | empty.ravel(), n_labels - 1, codes).reshape(len(chunk), n)
+        offsets = np.arange(len(chunk))[:, None] * n_labels
+        counts[start:start + len(chunk)] = np.bincount((codes + offsets).ravel(),
+                                                       minlength=len(chunk) * n_labels).reshape(len(chunk), n_labels)
+    return SweepResult(param_sets, counts, mean_va)
@@ -0,0 +1,182 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+from emotion_model import Personality
+from batch_appraisal import batch_appraise
+from emotion_batch import EmotionBatch
+from event_records import RECORD_DTYPE, RISK, LIVING, to_batch
+
+
+def random_records(rng, n, personality_bits):
+    """
+    n random events of one agent as RECORD_DTYPE, risk of living objects follows EventObjects.living_agent_risk
+    :param rng: numpy Generator
+    :param personality_bits: Personality.bits of the agent
+    """
+    records = np.zeros(n, dtype=RECORD_DTYPE)
+    records["importance"] = rng.uniform(-1, 1, n)
+    records["familiarity"] = rng.uniform(-1, 1, n)
+    records["total_progress"] = rng.choice([0, 0.25, 0.5, 0.75, 1], n)
+    records["contribution"] = rng.integers(0, 2, n)
+    flags = rng.integers(0, 32, n).astype(np.uint8)
+    p = Personality.from_bits(personality_bits)
+    living = flags & LIVING != 0
+    if p.E and p.A and not p.N:
+        flags[living] &= ~np.uint8(RISK)
+    elif not p.E and not p.A and p.N:
+        flags[living] |= np.uint8(RISK)
+    records["flags"] = flags
+    records["personality"] = personality_bits
+    return records
+
+
+def agent_rng(seed, agent_id):
+    # independent stream per agent, results do not depend on chunking or the number of processes
+    return np.random.default_rng([seed, agent_id])
+
+
+def _share(array):
+    # copy an array into a new shared memory block
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype)
+
+
+def _empty_shared(shape, dtype):
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return shm, (shm.name, shape, dtype)
+
+
+# shared blocks attached by a worker, name -> (SharedMemory, ndarray)
+_attached = {}
+
+
+def _attach(desc):
+    name, shape, dtype = desc
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    return _attached[name][1]
+
+
+def _simulate_chunk(task):
+    # appraise the events of agents [start, stop) and write valence/arousal and labels into the shared outputs
+    start, stop, spec = task
+    bits = _attach(spec["personalities"])
+    offsets = _attach(spec["offsets"])
+    va = _attach(spec["va"])
+    labels = _attach(spec["labels"])
+    lo, hi = offsets[start], offsets[stop]
+    if spec["records"] is not None:
+        records = _attach(spec["records"])[lo:hi]
+    else:
+        records = np.concatenate([random_records(agent_rng(spec["seed"], agent), offsets[agent + 1] - offsets[agent],
+                                                 bits[agent]) for agent in range(start, stop)])
+    if hi > lo:
+        events, traits = to_batch(records)
+        _, chunk_va = batch_appraise(events, traits, spec["context"])
+        va[lo:hi] = chunk_va
+        labels[lo:hi] = EmotionBatch.from_valence_arousal(chunk_va).label_codes()
+    return stop - start
+
+
+class PopulationResult:
+    # valence/arousal and label code of every event, agent i owns rows offsets[i]:offsets[i + 1]
+    def __init__(self, va, labels, offsets):
+        self.va = va
+        self.labels = labels
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def agent(self, i):
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.va[lo:hi], self.labels[lo:hi]
+
+    def final_emotions(self):
+        # (agents x 2) valence/arousal after the last event, NaN for agents without events
+        last = np.full((len(self), 2), np.nan)
+        has = self.offsets[1:] > self.offsets[:-1]
+        last[has] = self.va[self.offsets[1:][has] - 1]
+        return last
+
+
+class PopulationSimulator:
+    # spread agent-sessions over a process pool, results are gathered in shared memory
+    def __init__(self, personalities, records=None, offsets=None, events_per_agent=20, context="social", seed=0,
+                 processes=None, chunk_size=1024):
+        """
+        :param personalities: list of Personality or array of Personality.bits, one per agent
+        :param records: RECORD_DTYPE array of all scheduled events, agent major; None to generate random sessions
+        :param offsets: agent i owns records[offsets[i]:offsets[i + 1]], required with records
+        :param events_per_agent: length of generated sessions
+        :param context: 'individual' / 'social'
+        :param seed: seed of the generated sessions
+        :param processes: pool size, 1 runs in this process
+        :param chunk_size: agents per task
+        """
+        if not isinstance(personalities, np.ndarray):
+            personalities = [p.bits for p in personalities]
+        self.personalities = np.asarray(personalities, dtype=np.uint8)
+        n = len(self.personalities)
+        if records is not None:
+            if offsets is None or len(offsets) != n + 1:
+                raise ValueError("offsets must have one entry per agent plus one")
+            self.offsets = np.asarray(offsets, dtype=np.int64)
+            self.records = np.asarray(records, dtype=RECORD_DTYPE)
+        else:
+            self.offsets = np.arange(n + 1, dtype=np.int64) * events_per_agent
+            self.records = None
+        self.context = context
+        self.seed = seed
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def tasks(self, spec):
+        n = len(self.personalities)
+        return [(start, min(start + self.chunk_size, n), spec) for start in range(0, n, self.chunk_size)]
+
+    def run(self):
+        total = int(self.offsets[-1])
+        blocks = []
+        try:
+            shm, personalities = _share(self.personalities)
+            blocks.append(shm)
+            shm, offsets = _share(self.offsets)
+            blocks.append(shm)
+            records = None
+            if self.records is not None:
+                shm, records = _share(self.records)
+                blocks.append(shm)
+            shm, va = _empty_shared((total, 2), np.float64)
+            blocks.append(shm)
+            shm, labels = _empty_shared((total,), np.int16)
+            blocks.append(shm)
+            spec = {"personalities": personalities, "offsets": offsets, "records": records, "va": va,
+                    "labels": labels, "context": self.context, "seed": self.seed}
+            tasks = self.tasks(spec)
+            if self.processes == 1:
+                for task in tasks:
+                    _simulate_chunk(task)
+            else:
+                with multiprocessing.Pool(self.processes) as pool:
+                    for _ in pool.imap_unordered(_simulate_chunk, tasks):
+                        pass
+            result = PopulationResult(np.array(_attach(va)), np.array(_attach(labels)), self.offsets.copy())
+        finally:
+            for shm in blocks:
+                if shm.name in _attached:
+                    # drop the array view before closing, an exported buffer cannot be closed
+                    attached_shm, _ = _attached.pop(shm.name)
+                    attached_shm.close()
+                shm.close()
+                shm.unlink()
+        return result
+
+
+def simulate_population(personalities, **kwargs):
+    return PopulationSimulator(personalities, **kwargs).run()
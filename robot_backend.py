@@ -0,0 +1,43 @@
+import asyncio
+import importlib
+import os
+
+
+# backend name -> module exposing the cozmo SDK calls the games use
+BACKENDS = {"cozmo": "cozmo", "sim": "cozmo_sim"}
+
+_selected = None
+
+
+def use(name):
+    """
+    select the robot backend, call before the game modules are imported
+    :param name: "cozmo" for real robots, "sim" for the in-process simulator
+    """
+    global _selected
+    if name not in BACKENDS:
+        raise ValueError("unknown backend {}, expected one of {}".format(name, sorted(BACKENDS)))
+    _selected = name
+    return sdk()
+
+
+def name():
+    # explicit use() wins over COZMO_BACKEND, default is the real SDK
+    return _selected or os.environ.get("COZMO_BACKEND", "cozmo")
+
+
+def sdk():
+    return importlib.import_module(BACKENDS[name()])
+
+
+def is_simulated():
+    return name() == "sim"
+
+
+def event_loop():
+    # the loop connections are made on, the simulator runs on virtual time
+    if is_simulated():
+        loop = sdk().new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+    return asyncio.get_event_loop()
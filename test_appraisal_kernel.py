@@ -0,0 +1,9 @@
+from appraisal_kernel import check_against_interpreter
+
+
+def test_kernel_matches_interpreter():
+    check_against_interpreter(n=500, seed=0)
+
+
+def test_kernel_matches_interpreter_other_seed():
+    check_against_interpreter(n=500, seed=1)
@@ -0,0 +1,9 @@
+from batch_appraisal import check_against_scalar
+
+
+def test_batch_matches_scalar():
+    check_against_scalar(n=500, seed=0)
+
+
+def test_batch_matches_scalar_other_seed():
+    check_against_scalar(n=500, seed=1)
@@ -0,0 +1,77 @@
+import itertools
+import numpy as np
+import pytest
+
+from cube_assignment import assign_cubes, check_against_brute_force, distance_matrix, solve_partial
+
+
+def brute_force_partial(robot_to_cube, cube_to_cube):
+    # (-robots with a cube, total cost) of the best assignment, a robot needs a finite distance to its cube and the base
+    n_robots, n_cubes = robot_to_cube.shape
+    best = None
+    for b in range(n_cubes):
+        others = [c for c in range(n_cubes) if c != b]
+        for pick in itertools.product([-1] + others, repeat=n_robots):
+            chosen = [c for c in pick if c >= 0]
+            if len(chosen) != len(set(chosen)):
+                continue
+            costs = [robot_to_cube[r, c] + cube_to_cube[c, b] for r, c in enumerate(pick) if c >= 0]
+            costs += [np.inf for r, c in enumerate(pick) if c >= 0 and not np.isfinite(robot_to_cube[r, b])]
+            if not np.isfinite(costs).all():
+                continue
+            key = (-len(costs), sum(costs))
+            if best is None or key < best:
+                best = key
+    return best
+
+
+def check_valid(assignment, robot_to_cube):
+    picked = assignment.pick[assignment.pick >= 0]
+    assert len(picked) == len(set(picked.tolist()))
+    assert assignment.base not in picked
+    for r, c in enumerate(assignment.pick):
+        if c >= 0:
+            assert np.isfinite(robot_to_cube[r, c]) and np.isfinite(robot_to_cube[r, assignment.base])
+
+
+def test_optimal_against_brute_force():
+    check_against_brute_force(trials=200, seed=0)
+
+
+def test_unseen_cubes_and_fewer_cubes_than_robots():
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        n_robots, n_cubes = int(rng.integers(1, 5)), int(rng.integers(2, 5))
+        cubes = rng.uniform(0, 500, (n_cubes, 2))
+        robot_to_cube = distance_matrix(rng.uniform(0, 500, (n_robots, 2)), cubes)
+        robot_to_cube[rng.random(robot_to_cube.shape) < 0.3] = np.inf
+        cube_to_cube = distance_matrix(cubes, cubes)
+        assignment = assign_cubes(robot_to_cube, cube_to_cube, seed=int(rng.integers(100)))
+        check_valid(assignment, robot_to_cube)
+        count, cost = brute_force_partial(robot_to_cube, cube_to_cube)
+        assert -len(assignment.pick[assignment.pick >= 0]) == count
+        assert np.isclose(assignment.cost, cost)
+
+
+def test_robot_without_a_usable_cube():
+    inf = np.inf
+    # robot 1 has only seen cube 0, so it can neither pick up cube 1 nor build on it. building on cube 1 is cheaper,
+    # robot 1 is left without a cube
+    assignment = assign_cubes(np.array([[1.0, 2.0, inf], [1.0, inf, inf]]), np.zeros((3, 3)))
+    assert assignment.pick.tolist() == [0, -1] and assignment.base == 1
+    assert assignment.unassigned.tolist() == [1]
+
+
+def test_more_robots_than_cubes():
+    assignment = assign_cubes(np.array([[1.0, 5.0], [2.0, 1.0], [3.0, 3.0]]), np.array([[0.0, 1.0], [1.0, 0.0]]))
+    assert (assignment.pick >= 0).sum() == 1 and np.isclose(assignment.cost, 2.0)
+
+
+def test_solve_partial_marks_unusable_rows():
+    inf = np.inf
+    assert solve_partial(np.array([[inf, inf], [1.0, 2.0], [3.0, inf]])).tolist() == [-1, 1, 0]
+
+
+def test_too_few_cubes():
+    with pytest.raises(ValueError):
+        assign_cubes(np.ones((2, 1)), np.zeros((1, 1)))
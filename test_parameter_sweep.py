@@ -0,0 +1,19 @@
+import numpy as np
+
+from batch_appraisal import DEFAULT_PARAMS, random_events
+from emotion_classifier import EmotionClassifier
+from parameter_sweep import LABEL_COLUMNS, sweep
+
+
+def test_zero_weights_count_as_unlabeled():
+    events, personalities = random_events(200, seed=0)
+    param_sets = np.stack([DEFAULT_PARAMS, np.zeros_like(DEFAULT_PARAMS)])
+    for classifier in (None, EmotionClassifier(strength_bins=64, angle_bins=256)):
+        result = sweep(events, personalities, "social", param_sets, classifier=classifier)
+        reference = sweep(events, personalities, "social", DEFAULT_PARAMS[None, :], classifier=classifier)
+        assert np.array_equal(result.label_counts[0], reference.label_counts[0])
+        assert np.allclose(result.mean_va[0], reference.mean_va[0])
+        # every event of the all-zero set has no emotion
+        assert result.label_counts[1, LABEL_COLUMNS.index(None)] == len(events)
+        assert result.label_counts[1].sum() == len(events)
+        assert np.isnan(result.mean_va[1]).all()
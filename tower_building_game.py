@@ -1,40 +1,38 @@
-import cozmo
 import asyncio
 import sys
 import random
-from cozmo.util import distance_mm, speed_mmps, degrees, Pose
 from random import randint
 
+import robot_backend
+from action_executor import ActionExecutor, ActionFailed, act
+from action_graph import ActionGraph
+from action_trace import Tracer
+from cube_assignment import assign_cubes
+from face_watcher import FaceWatcher
+from world_state import WorldState
+
+# the real SDK or the simulator, see robot_backend
+cozmo = robot_backend.sdk()
+distance_mm, speed_mmps, degrees, Pose = (cozmo.util.distance_mm, cozmo.util.speed_mmps, cozmo.util.degrees,
+                                          cozmo.util.Pose)
+
 
 class Agent:
 
-    def __init__(self, robot, type):
+    def __init__(self, robot, type, num_cubes=3, aid=None, world_state=None):
         self.robot = robot
+        self.aid = aid
+        self.world_state = world_state
         self.world = robot.world
         self.behavior = None
         self.action = None
         self.cubes = None
-        self.cubes_dist = None
         self.min_dist_cube_id = None
         self.flag = False
+        self.role = None
         self.animation = None
         self.type = type
-
-    def calculate_dist(self, cube):
-        # calculate the distance between the robot and the cube
-        translation = self.robot.pose - cube.pose
-        return ((translation.position.x / 100) ** 2) + ((translation.position.y / 100) ** 2)
-
-    def get_cubes_dists(self, cubes):
-        # get distances between the robot and three cubes
-        self.cubes_dist = {cube.cube_id: self.calculate_dist(cube) for cube in cubes}
-
-    def get_n_min_dist_cube_id(self, n=1):
-        # find the closest cube out of 3
-        if not self.cubes_dist:
-            raise Exception("no cubes recognized now")
-        self.min_dist_cube_id = list(filter(
-            lambda cube_id: self.cubes_dist[cube_id] == sorted(self.cubes_dist.values())[n-1], self.cubes_dist))[0]
+        self.num_cubes = num_cubes
 
     def set_behavior(self, behavior):
         if self.behavior is not None:
@@ -50,168 +48,315 @@ class Agent:
     def celebrity(self):
         self.animation = self.robot.play_anim_trigger(cozmo.anim.Triggers.OnSpeedtapGameCozmoWinHighIntensity)
 
+    async def search_cubes(self, timeout):
+        # wait until the robot has seen all cubes or, with a shared world state, the team has located them. returns the
+        # robot's own cube objects, only those it has seen itself
+        searches = [self.world.wait_until_observe_num_objects(num=self.num_cubes, object_type=cozmo.objects.LightCube)]
+        if self.world_state is not None:
+            searches.append(self.world_state.all_found.wait())
+        tasks = [asyncio.ensure_future(search) for search in searches]
+        try:
+            await asyncio.wait_for(asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED), timeout)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if self.world_state is not None:
+            return self.world_state.cube_objects(self.aid)
+        return tasks[0].result()
+
+    def found_all(self):
+        # the robot itself or the team has located every cube
+        if self.world_state is not None and self.world_state.all_found.is_set():
+            return True
+        return len(self.cubes or ()) >= self.num_cubes
+
+    async def look_for(self, cube_ids, any_of=(), timeout=30):
+        # look around until the robot has seen the given cubes and one of any_of itself, needs a world state
+        look_around = self.robot.start_behavior(cozmo.behavior.BehaviorTypes.LookAroundInPlace)
+
+        async def wait():
+            await self.world_state.wait_seen(self.aid, cube_ids)
+            if any_of:
+                await self.world_state.wait_seen(self.aid, any_of, num=1)
+        try:
+            await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            print("robot {} didn't find cubes {}".format(self.aid, self.world_state.missing(self.aid)))
+        finally:
+            look_around.stop()
+        self.cubes = self.world_state.cube_objects(self.aid)
+        await act(self.robot.turn_in_place(degrees(0), is_absolute=True))
+
     async def recognize_cubes(self):
-        # the robot look around to find 3 cubes. For conveniences, cubes are placed in front of robots. Once the robots
+        # the robot look around to find the cubes. For conveniences, cubes are placed in front of robots. Once the robots
         # turn to an angle that cannot find cube, the robots is forced to turn to original angle and drive back for a
-        # short distance, then start looking again.
+        # short distance, then start looking again. The search ends as soon as the team has located every cube.
         flag = True
         while flag:
 
             look_around = self.robot.start_behavior(cozmo.behavior.BehaviorTypes.LookAroundInPlace)
             try:
-                self.cubes = await self.world.wait_until_observe_num_objects(num=3,
-                                                                             object_type=cozmo.objects.LightCube,
-                                                                             timeout=5)
+                self.cubes = await self.search_cubes(timeout=5)
             except asyncio.TimeoutError:
                 print("don't find cube")
-            else:
+            finally:
+                # also when the phase budget cancels the search
                 look_around.stop()
-                if len(self.cubes) == 3:
-                    # after cubes are found, robots show behaviors according to personality group
-                    if self.type == "rational":
-                        pass
-                    else:
-                        await self.robot.play_anim_trigger(cozmo.anim.Triggers.ComeHere_AlreadyHere).wait_for_completed()
-                    flag = False
-
-            await self.robot.turn_in_place(degrees(0), is_absolute=True).wait_for_completed()
-            await self.robot.drive_straight(distance_mm(-20), speed_mmps(50)).wait_for_completed()
-
+            if self.found_all():
+                # after cubes are found, robots show behaviors according to personality group
+                if self.type == "rational":
+                    pass
+                else:
+                    await act(self.robot.play_anim_trigger(cozmo.anim.Triggers.ComeHere_AlreadyHere))
+                flag = False
 
-class MultiAgents:
-
-    def __init__(self, *args):
-        self.type = args[2]
-        self.agent_x, self.agent_y = Agent(args[0], self.type), Agent(args[1], self.type)
-        self.agents_id = {1: self.agent_x, 2: self.agent_y}
-        self.targs = {1: {"pick_targ": None, "place_targ": None}, 2: {"pick_targ": None, "place_targ": None}}
-        self.flag = True # True means the robot is going to stack the second-layer
-        self.mid_cube = None
+            await act(self.robot.turn_in_place(degrees(0), is_absolute=True))
+            await act(self.robot.drive_straight(distance_mm(-20), speed_mmps(50)))
 
-    def who_last(self):
-        # randomly choose one robot
-        return random.choice(list(self.agents_id))
 
-    def calculate_cubes_params(self):
-        # calculate cube-robot distance for two robots and get the cube with shortest distance. if the closest cubes are
-        # same, randomly choose one robot to find the second close cube.
-        self.agent_x.get_cubes_dists(self.agent_x.cubes)
-        self.agent_y.get_cubes_dists(self.agent_y.cubes)
-
-        self.agent_x.get_n_min_dist_cube_id()
-        self.agent_y.get_n_min_dist_cube_id()
+class NoTower(Exception):
+    # the robots have not found the cubes for even a two-layer tower, the session ends
+    pass
 
-        if self.agent_x.min_dist_cube_id == self.agent_y.min_dist_cube_id:
-            self.agents_id[self.who_last()].get_n_min_dist_cube_id(n=2)
 
-    def cooperate_assign_cubes(self):
-        # assign the closest cube to robots as their "pick up" object, the rest one is assigned as target cube
-        place_targ_exclu_ids = [self.agent_x.min_dist_cube_id, self.agent_y.min_dist_cube_id]
+# gap between the cubes of placers next to the tower
+PLACER_SPACING = 120
+# seconds a robot may spend on a phase of the game
+PHASE_BUDGETS = {"recognize_cubes": 120, "plays_cube": 180, "talk": 30, "try_three_layer": 180,
+                 "seek_for_help": 90, "finished": 40}
 
-        for cube_x in self.agent_x.cubes:
 
-            if cube_x.cube_id == self.agent_x.min_dist_cube_id:
-                self.targs[1]["pick_targ"] = cube_x
-            if cube_x.cube_id not in place_targ_exclu_ids:
-                self.targs[1]["place_targ"] = cube_x
+class MultiAgents:
 
-        for cube_y in self.agent_y.cubes:
+    def __init__(self, *args, seed=0, tracer=None, executor=None):
+        # MultiAgents(robot_1, ..., robot_n, type), the robots need n + 1 cubes: one pick-up cube each and the base
+        *robots, self.type = args
+        self.seed = seed
+        # with an enabled action_trace.Tracer every action and wait of the robots is recorded
+        self.tracer = tracer if tracer is not None else Tracer(enabled=False)
+        robots = [self.tracer.wrap_robot(robot, aid) for aid, robot in enumerate(robots, start=1)]
+        self.assignment = None
+        self.base_cube_id = None
+        # cube sightings of every robot, the team shares which cubes are found, poses and objects stay per robot
+        self.world_state = WorldState(num_cubes=len(robots) + 1)
+        self.agents_id = {aid: Agent(robot, self.type, len(robots) + 1, aid, self.world_state)
+                          for aid, robot in enumerate(robots, start=1)}
+        for aid, agent in self.agents_id.items():
+            self.world_state.attach(aid, agent.robot)
+        self.targs = {aid: {"pick_targ": None, "place_targ": None} for aid in self.agents_id}
+        self.roles = {}
+        self.slots = {}
+        self.num_placed = 0
+        self.mid_cube = None
+        self.face_watcher = None
+        # bounded retries and time budgets of the actions, see action_executor
+        self.executor = executor if executor is not None else ActionExecutor()
+        # held while a phase of the robot runs, see action_graph.ActionGraph
+        self.locks = {aid: asyncio.Lock() for aid in self.agents_id}
+        self.handing_over = set()
+
+    def claim_role(self, aid):
+        # the first robot holding its cube stacks the second layer, the others place theirs next to the tower
+        role = "placer" if "stacker" in self.roles.values() else "stacker"
+        if self.roles.get(aid) != "stacker":
+            self.roles[aid] = role
+            self.agents_id[aid].role = role
+        if role == "placer":
+            self.slots[aid] = self.num_placed
+            self.num_placed += 1
+        return role
+
+    def placer_offset(self, aid):
+        # placers line up beside each other in front of the tower: 0, +spacing, -spacing, +2 spacing ...
+        k = self.slots[aid]
+        return PLACER_SPACING * ((k + 1) // 2) * (1 if k % 2 else -1)
 
-            if cube_y.cube_id == self.agent_y.min_dist_cube_id:
-                self.targs[2]["pick_targ"] = cube_y
-            if cube_y.cube_id not in place_targ_exclu_ids:
-                self.targs[2]["place_targ"] = cube_y
+    def calculate_cubes_params(self):
+        # robot x cube distances, every robot in its own frame, and the optimal pick-up and base cubes: the least
+        # travel to the pick-up cubes and from there to the base. robots only get cubes they have seen themselves, with
+        # fewer than n + 1 cubes found some robots get none
+        cube_ids = self.world_state.cube_ids()
+        if len(cube_ids) < 2:
+            raise NoTower("the team found {} of {} cubes".format(len(cube_ids), self.world_state.num_cubes))
+        robot_to_cube, cube_to_cube = self.world_state.distances(list(self.agents_id), cube_ids)
+        self.assignment = assign_cubes(robot_to_cube, cube_to_cube, seed=self.seed)
+        for agent, column in zip(self.agents_id.values(), self.assignment.pick):
+            agent.min_dist_cube_id = cube_ids[column] if column >= 0 else None
+        self.base_cube_id = cube_ids[self.assignment.base]
+
+    def missing_sightings(self):
+        # robots left without a cube that have not seen every cube the team has found
+        return [self.agents_id[aid] for aid in self.agents_id
+                if self.agents_id[aid].min_dist_cube_id is None and self.world_state.missing(aid)]
+
+    async def complete_sightings(self, timeout=30):
+        # robots that stopped searching on the team's signal look for cubes only their teammates have seen: the base
+        # and one of the cubes nobody picks up. the cubes are assigned again after every round, for at most timeout
+        # seconds
+        end = asyncio.get_event_loop().time() + timeout
+        for _ in self.agents_id:
+            remaining = end - asyncio.get_event_loop().time()
+            if not self.missing_sightings() or remaining <= 0:
+                break
+            picked = {agent.min_dist_cube_id for agent in self.agents_id.values()}
+            free = [cube_id for cube_id in self.world_state.cube_ids() if cube_id not in picked | {self.base_cube_id}]
+            await asyncio.gather(*(agent.look_for([self.base_cube_id], free, remaining)
+                                   for agent in self.missing_sightings()))
+            self.calculate_cubes_params()
 
-    async def agent_plays_cube(self, aid):
-        # one robot stack its "pick up" cube on target cube, the other one place its "pick up" cube to a predefined
-        # position where both robots can observe the cube.
+    def cooperate_assign_cubes(self):
+        # assign the chosen cube to robots as their "pick up" object and the base cube as target cube, both the
+        # robot's own objects
+        if all(agent.min_dist_cube_id is None for agent in self.agents_id.values()):
+            raise NoTower("no robot has seen both a cube to pick up and the base")
+        for aid, agent in self.agents_id.items():
+            if agent.min_dist_cube_id is not None:
+                self.targs[aid]["pick_targ"] = self.world_state.cube_object(aid, agent.min_dist_cube_id)
+            self.targs[aid]["place_targ"] = self.world_state.cube_object(aid, self.base_cube_id)
+
+    async def agent_plays_cube(self, aid, targ=None):
+        # one robot stack its "pick up" cube on target cube, the others place their "pick up" cube to a predefined
+        # position where all robots can observe the cube. a cube the robot cannot pick up is handed to another robot.
         agent = self.agents_id[aid]
+        targ = targ if targ is not None else self.targs[aid]
+        if targ["pick_targ"] is None:
+            print("robot {} has no cube to play".format(aid))
+            return
 
-        while True:
-            action = agent.robot.pickup_object(self.targs[aid]["pick_targ"], num_retries=1)
-            await action.wait_for_completed()
-            if action.has_succeeded:
-                break
-        x = self.targs[aid]["place_targ"].pose.position.x
-        y = self.targs[aid]["place_targ"].pose.position.y
-        z = self.targs[aid]["place_targ"].pose.position.z
-        if self.flag:
+        try:
+            await self.executor.run(agent.robot, "pickup_object", targ["pick_targ"], num_retries=1)
+        except ActionFailed as e:
+            print("robot {} gives up cube {}: {}".format(aid, targ["pick_targ"].cube_id, e))
+            await self.hand_over(aid, targ)
+            if targ is self.targs[aid]:
+                # the cube is not this robot's any more, a helper has moved it or nobody can pick it up, so the robot
+                # has no cube for the top layer either
+                targ["pick_targ"] = None
+            return
+        x = targ["place_targ"].pose.position.x
+        y = targ["place_targ"].pose.position.y
+        z = targ["place_targ"].pose.position.z
+        if self.claim_role(aid) == "stacker":
             self_y = agent.robot.pose.position.y
-            self.flag = False
 
-            await agent.robot.place_on_object(self.targs[aid]["place_targ"], num_retries=3).wait_for_completed()
+            await self.executor.run(agent.robot, "place_on_object", targ["place_targ"], num_retries=3)
             if self.type == "positive":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=False).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=False))
             elif self.type == "negative":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=False).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=False))
 
             # after stacking the second-layer cube, go to the robot and its cube
-            await agent.robot.drive_straight(distance_mm(-60), speed_mmps(100)).wait_for_completed()
+            await act(agent.robot.drive_straight(distance_mm(-60), speed_mmps(100)))
             if self_y < y:
-                await agent.robot.go_to_pose(Pose(x-100, self_y, z, angle_z=degrees(135))).wait_for_completed()
+                await act(agent.robot.go_to_pose(Pose(x-100, self_y, z, angle_z=degrees(135))))
             else:
-                await agent.robot.go_to_pose(Pose(x - 150, self_y, z, angle_z=degrees(-135))).wait_for_completed()
+                await act(agent.robot.go_to_pose(Pose(x - 150, self_y, z, angle_z=degrees(-135))))
             agent.flag = True
-            self.mid_cube = self.targs[aid]["pick_targ"]
+            self.mid_cube = targ["pick_targ"]
 
         else:
-            await agent.robot.go_to_pose(Pose(x-200, y, z, angle_z=degrees(0))).wait_for_completed()
-            await agent.robot.place_object_on_ground_here(self.targs[aid]["pick_targ"]).wait_for_completed()
-            await agent.robot.drive_straight(distance_mm(-30), speed_mmps(30)).wait_for_completed()
+            await self.executor.run(agent.robot, "go_to_pose", Pose(x-200, y + self.placer_offset(aid), z,
+                                                                    angle_z=degrees(0)))
+            await act(agent.robot.place_object_on_ground_here(targ["pick_targ"]))
+            await act(agent.robot.drive_straight(distance_mm(-30), speed_mmps(30)))
             if self.type == "positive":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabSquint1,
-                                                ignore_body_track=False).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabSquint1, ignore_body_track=False))
             elif self.type == "negative":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabNo,
-                                                    ignore_body_track=False).wait_for_completed()
-
-    async def talk(self):
-        # robots communicate with expressions corresponding to their personality
-        choices_bad = [cozmo.anim.Triggers.FrustratedByFailure, cozmo.anim.Triggers.CodeLabNo,
-                       cozmo.anim.Triggers.BuildPyramidFirstBlockOnSide, cozmo.anim.Triggers.CodeLabFrustrated,
-                       cozmo.anim.Triggers.AskToBeRightedRight, cozmo.anim.Triggers.AskToBeRightedLeft,
-                       cozmo.anim.Triggers.CozmoSaysBadWord]
-        choices_good = [cozmo.anim.Triggers.CodeLabChatty, cozmo.anim.Triggers.CodeLabReactHappy,
-                        cozmo.anim.Triggers.CodeLabTakaTaka, cozmo.anim.Triggers.CodeLabThinking,
-                        cozmo.anim.Triggers.CodeLabWondering, cozmo.anim.Triggers.CozmoSaysSpeakGetInLong,
-                        cozmo.anim.Triggers.BuildPyramidFirstBlockUpright, cozmo.anim.Triggers.PutDownBlockPutDown]
-
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabNo, ignore_body_track=False))
+
+    async def hand_over(self, aid, targ):
+        # the cube goes to the first robot that is free between two of its phases, has seen the cube and the base and
+        # has not tried it yet. robots handing over a cube themselves are left out, so two robots never wait for each
+        # other
+        cube_id, base_id = targ["pick_targ"].cube_id, targ["place_targ"].cube_id
+        tried = targ.get("tried", set()) | {aid}
+        candidates = [a for a in self.agents_id if a not in tried and a not in self.handing_over and
+                      self.world_state.cube_object(a, cube_id) is not None and
+                      self.world_state.cube_object(a, base_id) is not None]
+        if not candidates:
+            print("no robot left to take cube {}".format(cube_id))
+            return
+        self.handing_over.add(aid)
+        try:
+            helper = await self.borrow(candidates)
+        finally:
+            self.handing_over.discard(aid)
+        try:
+            print("robot {} takes over cube {}".format(helper, cube_id))
+            # the helper works with its own objects of the cubes
+            await self.agent_plays_cube(helper, {"pick_targ": self.world_state.cube_object(helper, cube_id),
+                                                 "place_targ": self.world_state.cube_object(helper, base_id),
+                                                 "tried": tried})
+        finally:
+            self.locks[helper].release()
+
+    async def borrow(self, aids):
+        # lock the first of the robots to become free, the caller releases it
+        acquires = {asyncio.ensure_future(self.locks[aid].acquire()): aid for aid in aids}
+        waited = False
+        try:
+            await asyncio.wait(acquires, return_when=asyncio.FIRST_COMPLETED)
+            waited = True
+        finally:
+            for task in acquires:
+                task.cancel()
+            await asyncio.gather(*acquires, return_exceptions=True)
+            free = sorted(aid for task, aid in acquires.items() if not task.cancelled())
+            # several robots may have become free at once, keep the lowest id, none when we were cancelled
+            keep = free[:1] if waited else []
+            for aid in free[len(keep):]:
+                self.locks[aid].release()
+        return keep[0]
+
+    def talk_choices(self):
+        # expressions a robot of this personality group talks with
         if self.type == "positive":
-            choices = choices_good
+            return [cozmo.anim.Triggers.CodeLabChatty, cozmo.anim.Triggers.CodeLabReactHappy,
+                    cozmo.anim.Triggers.CodeLabTakaTaka, cozmo.anim.Triggers.CodeLabThinking,
+                    cozmo.anim.Triggers.CodeLabWondering, cozmo.anim.Triggers.CozmoSaysSpeakGetInLong,
+                    cozmo.anim.Triggers.BuildPyramidFirstBlockUpright, cozmo.anim.Triggers.PutDownBlockPutDown]
         elif self.type == "negative":
-            choices = choices_bad
-        await self.agent_x.robot.play_anim_trigger(random.choice(choices), ignore_body_track=True).wait_for_completed()
-        await self.agent_y.robot.play_anim_trigger(random.choice(choices), ignore_body_track=True).wait_for_completed()
-        await self.agent_x.robot.play_anim_trigger(random.choice(choices), ignore_body_track=True).wait_for_completed()
-        await self.agent_y.robot.play_anim_trigger(random.choice(choices), ignore_body_track=True).wait_for_completed()
+            return [cozmo.anim.Triggers.FrustratedByFailure, cozmo.anim.Triggers.CodeLabNo,
+                    cozmo.anim.Triggers.BuildPyramidFirstBlockOnSide, cozmo.anim.Triggers.CodeLabFrustrated,
+                    cozmo.anim.Triggers.AskToBeRightedRight, cozmo.anim.Triggers.AskToBeRightedLeft,
+                    cozmo.anim.Triggers.CozmoSaysBadWord]
+
+    async def talk_line(self, aid):
+        # one turn of the conversation
+        agent = self.agents_id[aid]
+        await act(agent.robot.play_anim_trigger(random.choice(self.talk_choices()), ignore_body_track=True))
 
     async def try_hard(self, aid):
         # working hard expression
         agent = self.agents_id[aid]
-        await agent.robot.set_lift_height(0.7, accel=10.0, max_speed=1.0, duration=0.0, in_parallel=False,
-                              num_retries=0).wait_for_completed()
-        await agent.robot.set_lift_height(1, accel=0.1, max_speed=0.1, duration=2.0, in_parallel=False,
-                              num_retries=0).wait_for_completed()
+        await act(agent.robot.set_lift_height(0.7, accel=10.0, max_speed=1.0, duration=0.0, in_parallel=False,
+                                              num_retries=0))
+        await act(agent.robot.set_lift_height(1, accel=0.1, max_speed=0.1, duration=2.0, in_parallel=False,
+                                              num_retries=0))
         if self.type == "positive" or self.type == "negative":
-            await agent.robot.play_anim_trigger(cozmo.anim.Triggers.WorkoutStrongLift_lowEnergy,
-                                ignore_lift_track=True).wait_for_completed()
+            await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.WorkoutStrongLift_lowEnergy,
+                                                    ignore_lift_track=True))
 
     async def try_three_layer(self, aid):
         # try to stack the top-layer cube
         agent = self.agents_id[aid]
+        if not agent.flag and self.targs[aid]["pick_targ"] is None:
+            print("robot {} has no cube for the top layer".format(aid))
+            return
         y = self.targs[aid]["place_targ"].pose.position.y
         if agent.flag:
             self_y = agent.robot.pose.position.y
             if self.type == "positive" or self.type == "negative":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabConducting).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabConducting))
             if self_y < y:
-                await agent.robot.turn_in_place(degrees(45), is_absolute=True).wait_for_completed()
+                await act(agent.robot.turn_in_place(degrees(45), is_absolute=True))
             else:
-                await agent.robot.turn_in_place(degrees(-45), is_absolute=True).wait_for_completed()
+                await act(agent.robot.turn_in_place(degrees(-45), is_absolute=True))
 
         else:
-            await agent.robot.pickup_object(self.targs[aid]["pick_targ"], num_retries=1).wait_for_completed()
-            await agent.robot.go_to_object(self.targs[aid]["place_targ"], distance_from_object=distance_mm(100)).wait_for_completed()
+            await self.executor.run(agent.robot, "pickup_object", self.targs[aid]["pick_targ"], num_retries=1)
+            await self.executor.run(agent.robot, "go_to_object", self.targs[aid]["place_targ"],
+                                    distance_from_object=distance_mm(100))
             if self.type == "positive":
                 num_of_tries = 3
             elif self.type == "negative":
@@ -222,57 +367,70 @@ class MultiAgents:
                 await self.try_hard(aid)
 
             if self.type == 'positive':
-                await agent.robot.drive_straight(distance_mm(-30), speed_mmps(100)).wait_for_completed()
-                await agent.robot.place_object_on_ground_here(self.targs[aid]["pick_targ"]).wait_for_completed()
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabDejected).wait_for_completed()
+                await act(agent.robot.drive_straight(distance_mm(-30), speed_mmps(100)))
+                await act(agent.robot.place_object_on_ground_here(self.targs[aid]["pick_targ"]))
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabDejected))
             elif self.type == 'negative':
-                await agent.robot.drive_straight(distance_mm(-30), speed_mmps(100)).wait_for_completed()
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.MajorFail).wait_for_completed()
+                await act(agent.robot.drive_straight(distance_mm(-30), speed_mmps(100)))
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.MajorFail))
             else:
-                await agent.robot.place_object_on_ground_here(self.targs[aid]["pick_targ"]).wait_for_completed()
+                await act(agent.robot.place_object_on_ground_here(self.targs[aid]["pick_targ"]))
 
-    async def search_face(self, aid, round):
-        # looking for human face
+    def start_face_watch(self):
+        # every robot watches for a human face for the whole help-seeking phase
+        self.face_watcher = FaceWatcher({aid: agent.robot for aid, agent in self.agents_id.items()}).start()
+
+    async def stop_face_watch(self):
+        if self.face_watcher is not None:
+            await self.face_watcher.stop()
+
+    async def scan_for_face(self, aid, round):
+        # turn left and right with the head higher every round, pausing to look. a detection cancels the scan, a
+        # detection during a pause ends it as well
         agent = self.agents_id[aid]
-        face = None
-        await agent.robot.turn_in_place(degrees(0), is_absolute=True).wait_for_completed()
+        watcher = self.face_watcher
+        await act(agent.robot.turn_in_place(degrees(0), is_absolute=True))
         for i in range(round):
-            await agent.robot.set_head_angle(degrees(20 + i * 20)).wait_for_completed()
-            degree = agent.robot.head_angle
-            if face:
-                agent.robot.set_all_backpack_lights(cozmo.lights.blue_light)
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.ComeHere_SearchForFace_FoundFace).wait_for_completed()
-                await agent.robot.set_head_angle(degree).wait_for_completed()
-                asyncio.sleep(2)
-                agent.robot.set_all_backpack_lights(cozmo.lights.off_light)
-                break
-            degree1 = randint(30, 50)
-
-            await agent.robot.turn_in_place(degrees(degree1)).wait_for_completed()
-            try:
-                face = await agent.robot.world.wait_for_observed_face(timeout=2)
-            except asyncio.TimeoutError:
-                print("Didn't find a face.")
+            await act(agent.robot.set_head_angle(degrees(20 + i * 20)))
+            await act(agent.robot.turn_in_place(degrees(randint(30, 50))))
+            if await watcher.wait(timeout=2) is not None:
+                return
+            print("Didn't find a face.")
+            await act(agent.robot.turn_in_place(degrees(-randint(30, 50))))
+            if await watcher.wait(timeout=2) is not None:
+                return
+            print("Didn't find a face.")
 
-            degree2 = -randint(30, 50)
-            await agent.robot.turn_in_place(degrees(degree2)).wait_for_completed()
-            try:
-                face = agent.robot.world.wait_for_observed_face(timeout=2)
-            except asyncio.TimeoutError:
-                print("Didn't find a face.")
+    async def search_face(self, aid, round):
+        # looking for human face, the scan stops as soon as any robot sees one
+        agent = self.agents_id[aid]
+        if self.face_watcher is None:
+            self.start_face_watch()
+        face = await self.face_watcher.scan(self.scan_for_face(aid, round))
+        if face:
+            degree = agent.robot.head_angle
+            agent.robot.set_all_backpack_lights(cozmo.lights.blue_light)
+            await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.ComeHere_SearchForFace_FoundFace))
+            await act(agent.robot.set_head_angle(degree))
+            await asyncio.sleep(2)
+            agent.robot.set_all_backpack_lights(cozmo.lights.off_light)
 
     async def seek_for_help(self, aid):
         # expressions during seeking help stage
         agent = self.agents_id[aid]
         if agent.flag:
-            await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabHeadsUp).wait_for_completed()
+            await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabHeadsUp))
             await self.search_face(aid, 5)
-            await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabConducting, ignore_body_track=True).wait_for_completed()
+            await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabConducting, ignore_body_track=True))
         else:
             if self.type == "positive":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabDejected).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabDejected))
             elif self.type == "negative":
-                await agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabUnhappy).wait_for_completed()
+                await act(agent.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabUnhappy))
+
+    def base_watcher(self):
+        # a robot that has seen the base cube, it waits for the tap on its own object of the cube
+        return next((aid for aid in self.agents_id if self.targs[aid]["place_targ"] is not None), None)
 
     async def finished(self, aid1):
         # robots show corresponding expressions based on whether the top-layer cube is stacked with the specified time
@@ -284,67 +442,118 @@ class MultiAgents:
         try:
             print("Waiting for cube to be tapped")
 
-            await cube.wait_for_tap(timeout=10)
+            async with self.tracer.span(aid1, "wait_for_tap"):
+                await cube.wait_for_tap(timeout=10)
             print("Cube tapped")
         except asyncio.TimeoutError:
             print("No-one tapped our cube :-(")
-            anim_x = self.agent_x.robot.play_anim_trigger(cozmo.anim.Triggers.VC_Refuse_energy, ignore_body_track=True,
-                                                          ignore_lift_track=True)
-            anim_y = self.agent_y.robot.play_anim_trigger(cozmo.anim.Triggers.VC_Refuse_energy, ignore_body_track=True,
-                                                          ignore_lift_track=True)
-            await anim_x.wait_for_completed()
-            await anim_y.wait_for_completed()
+            trigger = cozmo.anim.Triggers.VC_Refuse_energy
         else:
-            anim_x = self.agent_x.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=True,
-                                                       ignore_lift_track=True)
-            anim_y = self.agent_y.robot.play_anim_trigger(cozmo.anim.Triggers.CodeLabWin, ignore_body_track=True,
-                                                   ignore_lift_track=True)
-            await anim_x.wait_for_completed()
-            await anim_y.wait_for_completed()
-
-
-def main(sdk_1, sdk_2, loop):
-    # the whole procedure of tower building game
-    async def init(sdk1, sdk2):
-        # initialize two robots and their connections
-        robot_x = await sdk1.wait_for_robot()
-        robot_y = await sdk2.wait_for_robot()
-
-        multi_agents = MultiAgents(robot_x, robot_y, "negative")
-        return multi_agents
-    # initialize connections to two robots
-    agents = loop.run_until_complete(init(sdk_1, sdk_2))
-    # robots finding cubes
-    loop.run_until_complete(asyncio.gather(agents.agents_id[1].recognize_cubes(), agents.agents_id[2].recognize_cubes()))
-    # calculate robot-cube distances
-    agents.calculate_cubes_params()
-    # assign cubes based on distances
-    agents.cooperate_assign_cubes()
-    # one robot stack second-layer cube, the other one place the cube to predefined position
-    loop.run_until_complete(asyncio.gather(agents.agent_plays_cube(1), agents.agent_plays_cube(2)))
-    # robots in emotional groups have explicit communication
+            trigger = cozmo.anim.Triggers.CodeLabWin
+        await self.all_play_anim(trigger, ignore_body_track=True, ignore_lift_track=True)
+
+    async def all_play_anim(self, trigger, **kwargs):
+        # every robot plays the animation at the same time
+        anims = [agent.robot.play_anim_trigger(trigger, **kwargs) for agent in self.agents_id.values()]
+        await asyncio.gather(*(act(anim) for anim in anims))
+
+
+def game_graph(agents, talk_rounds=2, budgets=PHASE_BUDGETS):
+    """
+    the game as a dependency graph, every robot moves on as soon as what it waits for is done instead of waiting
+    for the slowest robot of every phase
+    :param agents: MultiAgents
+    :param budgets: seconds per phase, a robot that overruns gives up the phase, see action_executor
+    :return: action_graph.ActionGraph
+    """
+    graph = ActionGraph(locks=agents.locks)
+    aids = list(agents.agents_id)
+    for aid in aids:
+        graph.add("recognize_cubes/{}".format(aid), agents.agents_id[aid].recognize_cubes, robot=aid)
+
+    async def assign():
+        # calculate robot-cube distances and assign cubes based on them. robots that stopped searching once the team
+        # had found every cube may lack the sightings they need, they look for those cubes first
+        agents.calculate_cubes_params()
+        await agents.complete_sightings()
+        agents.cooperate_assign_cubes()
+    graph.add("assign_cubes", assign, after=["recognize_cubes/{}".format(aid) for aid in aids])
+
+    # one robot stack second-layer cube, the others place their cube to predefined positions
+    last = {}
+    for aid in aids:
+        last[aid] = graph.add("plays_cube/{}".format(aid), lambda aid=aid: agents.agent_plays_cube(aid),
+                              after=["assign_cubes"], robot=aid)
+    # robots in emotional groups take turns talking, a robot starts once it is done with its cube and it is its turn
     if agents.type != "rational":
-        loop.run_until_complete(agents.talk())
+        previous = None
+        for i in range(talk_rounds):
+            for aid in aids:
+                after = [last[aid]] + ([previous] if previous else [])
+                previous = last[aid] = graph.add("talk/{}/{}".format(aid, i), lambda aid=aid: agents.talk_line(aid),
+                                                 after=after, robot=aid)
     # robots try to stack top-layer cube
-    loop.run_until_complete(asyncio.gather(agents.try_three_layer(1), agents.try_three_layer(2)))
-    # robots expressions during seeking help stage
-    loop.run_until_complete(asyncio.gather(agents.seek_for_help(1), agents.seek_for_help(2)))
+    tries = [graph.add("try_three_layer/{}".format(aid), lambda aid=aid: agents.try_three_layer(aid),
+                       after=[last[aid]], robot=aid) for aid in aids]
+    # robots expressions during seeking help stage, after every robot has failed the top layer, all robots watch for a
+    # face meanwhile
+
+    async def start_watch():
+        agents.start_face_watch()
+    graph.add("face_watch", start_watch, after=tries)
+    helps = [graph.add("seek_for_help/{}".format(aid), lambda aid=aid: agents.seek_for_help(aid), after=["face_watch"],
+                       robot=aid) for aid in aids]
+    graph.add("face_watch_stop", agents.stop_face_watch, after=helps)
     # robots reaction to the game result
-    loop.run_until_complete(agents.finished(1))
+    graph.add("finished", lambda: agents.finished(agents.base_watcher()), after=["face_watch_stop"])
+    return agents.executor.instrument(graph, budgets)
+
+
+async def connect_all(connections, type="negative", seed=0, tracer=None):
+    # wait for every robot at once and group them
+    robots = await asyncio.gather(*(connection.wait_for_robot() for connection in connections))
+    return MultiAgents(*robots, type, seed=seed, tracer=tracer)
+
+
+def main(connections, loop, type="negative", seed=0, trace=None):
+    """
+    the whole procedure of tower building game
+    :param connections: one SDK connection per robot
+    :param loop: the loop the connections were made on
+    :param seed: decides between equally good cube assignments
+    :param trace: path prefix, the action trace is written to <trace>.json (Chrome trace) and <trace>.bin
+    :return: action_graph.GraphReport, None when the robots did not find enough cubes for a tower
+    """
+    tracer = Tracer(enabled=trace is not None)
+    agents = loop.run_until_complete(connect_all(connections, type, seed, tracer))
+    try:
+        report = loop.run_until_complete(tracer.instrument(game_graph(agents)).run())
+    except NoTower as e:
+        print("no tower to build, the session ends: {}".format(e))
+        report = None
+    else:
+        report.summary()
+    if trace is not None:
+        tracer.write_chrome_trace(trace + ".json")
+        tracer.write_binary(trace + ".bin")
+    return report
 
 
 if __name__ == '__main__':
 
     cozmo.setup_basic_logging()
-    al_loop = asyncio.get_event_loop()
+    al_loop = robot_backend.event_loop()
     cozmo.robot.Robot.drive_off_charger_on_connect = False
-    # Connect to both robots
+    # number of robots, e.g. --robots 3
+    num_robots = int(sys.argv[sys.argv.index("--robots") + 1]) if "--robots" in sys.argv else 2
+    if robot_backend.is_simulated():
+        cozmo.configure(**cozmo.team_layout(num_robots))
 
     try:
-        conn1 = cozmo.connect_on_loop(al_loop)
-        conn2 = cozmo.connect_on_loop(al_loop)
+        connections = [cozmo.connect_on_loop(al_loop) for _ in range(num_robots)]
     except cozmo.ConnectionError as e:
         sys.exit("A connection error occurred: %s" % e)
 
-    main(conn1, conn2, al_loop)
-
+    # action trace, e.g. --trace session_01
+    trace = sys.argv[sys.argv.index("--trace") + 1] if "--trace" in sys.argv else None
+    main(connections, al_loop, trace=trace)
@@ -0,0 +1,207 @@
+import json
+import os
+import numpy as np
+
+from emotion_batch import EmotionBatch
+
+
+# one raw little-endian file per column, <column>.bin, plus meta.json
+COLUMNS = {"agent": "<i8", "timestamp": "<f8", "x": "<f8", "y": "<f8", "strength": "<f8", "angle": "<f8",
+           "label": "<i2"}
+META = "meta.json"
+
+
+def _column_path(path, name):
+    return os.path.join(path, name + ".bin")
+
+
+def _read_meta(path):
+    with open(os.path.join(path, META)) as f:
+        return json.load(f)
+
+
+class TrajectoryWriter:
+    # append-only writer, rows are appended to every column file at once
+    def __init__(self, path):
+        """
+        :param path: store directory, created if missing, an existing store is appended to
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, META)):
+            meta = _read_meta(path)
+            # rows beyond the last complete write are ignored by the reader and overwritten here
+            self.rows = meta["rows"]
+            self.time_sorted = meta["time_sorted"]
+            self.last_time = meta["last_time"]
+            self.agent_sorted = meta["agent_sorted"]
+            self.last_key = tuple(meta["last_key"]) if meta["last_key"] else None
+        else:
+            self.rows = 0
+            self.time_sorted = True
+            self.agent_sorted = True
+            self.last_time = None
+            self.last_key = None
+        self.files = {}
+        for name in COLUMNS:
+            f = open(_column_path(path, name), "r+b" if os.path.exists(_column_path(path, name)) else "w+b")
+            f.truncate(self.rows * np.dtype(COLUMNS[name]).itemsize)
+            f.seek(0, os.SEEK_END)
+            self.files[name] = f
+        self._write_meta()
+
+    def append(self, agent, timestamp, emotions):
+        """
+        :param agent: int or int array, agent id of every row
+        :param timestamp: float or float array
+        :param emotions: EmotionBatch
+        """
+        n = len(emotions)
+        agent = np.broadcast_to(np.asarray(agent, dtype=COLUMNS["agent"]), (n,))
+        timestamp = np.broadcast_to(np.asarray(timestamp, dtype=COLUMNS["timestamp"]), (n,))
+        columns = {"agent": agent, "timestamp": timestamp, "x": emotions.x, "y": emotions.y,
+                   "strength": emotions.strength, "angle": emotions.angle, "label": emotions.label_codes()}
+        for name, values in columns.items():
+            self.files[name].write(np.ascontiguousarray(values, dtype=COLUMNS[name]).tobytes())
+        if n:
+            self._track_order(agent, timestamp)
+        self.rows += n
+        return n
+
+    def append_xy(self, agent, timestamp, x, y):
+        return self.append(agent, timestamp, EmotionBatch.from_xy(x, y))
+
+    def append_trajectory(self, trajectory, agents, t0=0.0, dt=1.0):
+        # rows of an emotion_batch.Trajectory, step k of every agent at t0 + (k + 1) * dt, agent major
+        n_agents, n_steps = trajectory.shape
+        agent = np.repeat(np.asarray(agents, dtype=np.int64), n_steps)
+        timestamp = np.tile(t0 + dt * np.arange(1, n_steps + 1), n_agents)
+        return self.append(agent, timestamp, trajectory.batch())
+
+    def _track_order(self, agent, timestamp):
+        if self.time_sorted:
+            first_ok = self.last_time is None or timestamp[0] >= self.last_time
+            self.time_sorted = bool(first_ok and (np.diff(timestamp) >= 0).all())
+        if self.agent_sorted:
+            key_ok = self.last_key is None or (agent[0], timestamp[0]) >= self.last_key
+            same = agent[1:] == agent[:-1]
+            self.agent_sorted = bool(key_ok and (np.diff(agent) >= 0).all() and
+                                     (np.diff(timestamp)[same] >= 0).all())
+        self.last_time = float(timestamp[-1]) if self.last_time is None else max(self.last_time, float(timestamp.max()))
+        self.last_key = (int(agent[-1]), float(timestamp[-1]))
+
+    def _write_meta(self):
+        meta = {"columns": COLUMNS, "rows": self.rows, "time_sorted": self.time_sorted,
+                "agent_sorted": self.agent_sorted, "last_time": self.last_time,
+                "last_key": list(self.last_key) if self.last_key else None}
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def flush(self):
+        # make the appended rows visible to readers
+        for f in self.files.values():
+            f.flush()
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    # zero-copy reader, every column is a read-only memmap
+    def __init__(self, path):
+        self.path = path
+        meta = _read_meta(path)
+        self.rows = meta["rows"]
+        self.time_sorted = meta["time_sorted"]
+        self.agent_sorted = meta["agent_sorted"]
+        self.columns = {}
+        for name, dtype in meta["columns"].items():
+            if self.rows:
+                self.columns[name] = np.memmap(_column_path(path, name), dtype=dtype, mode="r", shape=(self.rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+        self._agent_index = None
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows_view(self, rows):
+        # the columns at the given slice or index array, a slice keeps them zero-copy
+        return {name: column[rows] for name, column in self.columns.items()}
+
+    def emotions(self, rows=slice(None)):
+        c = self.columns
+        return EmotionBatch(c["x"][rows], c["y"][rows], c["strength"][rows], c["angle"][rows])
+
+    def time_slice(self, t0=None, t1=None):
+        # rows with t0 <= timestamp < t1, a slice when the store was written in time order
+        timestamp = self.columns["timestamp"]
+        if self.time_sorted:
+            lo = 0 if t0 is None else int(np.searchsorted(timestamp, t0, "left"))
+            hi = self.rows if t1 is None else int(np.searchsorted(timestamp, t1, "left"))
+            return slice(lo, hi)
+        mask = np.ones(self.rows, dtype=bool)
+        if t0 is not None:
+            mask &= timestamp >= t0
+        if t1 is not None:
+            mask &= timestamp < t1
+        return np.flatnonzero(mask)
+
+    def agent_slice(self, agent, t0=None, t1=None):
+        # rows of one agent, optionally within [t0, t1), a slice when the store is agent sorted (see compact)
+        agents = self.columns["agent"]
+        if self.agent_sorted:
+            lo = int(np.searchsorted(agents, agent, "left"))
+            hi = int(np.searchsorted(agents, agent, "right"))
+            timestamp = self.columns["timestamp"][lo:hi]
+            if t0 is not None:
+                lo += int(np.searchsorted(timestamp, t0, "left"))
+                timestamp = self.columns["timestamp"][lo:hi]
+            if t1 is not None:
+                hi = lo + int(np.searchsorted(timestamp, t1, "left"))
+            return slice(lo, hi)
+        rows = self._agent_rows(agent)
+        timestamp = self.columns["timestamp"][rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if t0 is not None:
+            keep &= timestamp >= t0
+        if t1 is not None:
+            keep &= timestamp < t1
+        return rows[keep]
+
+    def _agent_rows(self, agent):
+        # row index grouped by agent, built once per reader
+        if self._agent_index is None:
+            order = np.argsort(self.columns["agent"], kind="stable")
+            self._agent_index = (order, self.columns["agent"][order])
+        order, agents = self._agent_index
+        return order[np.searchsorted(agents, agent, "left"):np.searchsorted(agents, agent, "right")]
+
+    def agents(self):
+        return np.unique(self.columns["agent"])
+
+
+def compact(path, out_path, chunk_rows=1 << 20):
+    # rewrite a store sorted by (agent, timestamp) so agent_slice returns zero-copy slices
+    reader = TrajectoryReader(path)
+    order = np.lexsort((reader["timestamp"], reader["agent"]))
+    with TrajectoryWriter(out_path) as writer:
+        for start in range(0, len(order), chunk_rows):
+            rows = order[start:start + chunk_rows]
+            writer.append(reader["agent"][rows], reader["timestamp"][rows], reader.emotions(rows))
+    return TrajectoryReader(out_path)
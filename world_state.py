@@ -0,0 +1,153 @@
+import asyncio
+import numpy as np
+
+import robot_backend
+from cube_assignment import distance_matrix
+
+
+class Observation:
+    __slots__ = ("cube_id", "x", "y", "z", "timestamp", "observer", "obj")
+
+    def __init__(self, cube_id, x, y, z, timestamp, observer, obj):
+        self.cube_id = cube_id
+        self.x, self.y, self.z = x, y, z
+        self.timestamp = timestamp
+        self.observer = observer
+        self.obj = obj
+
+    def __repr__(self):
+        return "<Observation cube {} ({:.0f}, {:.0f}) by robot {} at {:.2f}>".format(
+            self.cube_id, self.x, self.y, self.observer, self.timestamp)
+
+
+class WorldState:
+    # cube sightings of the whole team, fed by the object-observed events of every robot. every robot has its own pose
+    # origin and its own cube objects, so poses and objects are kept per robot and never mixed between robots; the
+    # team only shares which cubes have been found
+    def __init__(self, num_cubes, clock=None):
+        """
+        :param num_cubes: cubes the team is looking for, all_found is set once they are located
+        :param clock: time source of the timestamps, default the running loop's time()
+        """
+        self.num_cubes = num_cubes
+        self.clock = clock
+        # cube id -> latest observation by any robot, in the observer's frame
+        self.table = {}
+        # robot id -> cube id -> latest observation by the robot itself, in its own frame
+        self.seen = {}
+        self.robots = {}
+        self.handlers = {}
+        self.changed = {}
+        self.all_found = asyncio.Event()
+        # robot id -> its seen cube ids, their (C x 2) positions and (C x C) distances, dropped at its next sighting
+        self._tables = {}
+        # (robot ids, cube ids) and the team's cube -> cube distances, dropped at any sighting
+        self._cube_to_cube = None
+
+    def _now(self):
+        return self.clock() if self.clock is not None else asyncio.get_event_loop().time()
+
+    def attach(self, aid, robot):
+        # subscribe to the robot's object-observed events
+        def on_observed(evt, **kwargs):
+            if isinstance(evt.obj, robot_backend.sdk().objects.LightCube):
+                self.observe(aid, evt.obj, evt.pose)
+        self.robots[aid] = robot
+        self.seen.setdefault(aid, {})
+        self.changed[aid] = asyncio.Event()
+        self.handlers[aid] = robot.world.add_event_handler(robot_backend.sdk().objects.EvtObjectObserved,
+                                                           on_observed)
+
+    def detach(self, aid):
+        robot = self.robots.pop(aid)
+        robot.world.remove_event_handler(robot_backend.sdk().objects.EvtObjectObserved, self.handlers.pop(aid))
+
+    def observe(self, aid, cube, pose):
+        # the robot's latest observation of a cube replaces its earlier one
+        observation = Observation(cube.cube_id, pose.position.x, pose.position.y, pose.position.z, self._now(), aid,
+                                  cube)
+        self.seen.setdefault(aid, {})[cube.cube_id] = observation
+        self.table[cube.cube_id] = observation
+        self._tables.pop(aid, None)
+        self._cube_to_cube = None
+        if aid in self.changed:
+            self.changed[aid].set()
+        if len(self.table) >= self.num_cubes:
+            self.all_found.set()
+
+    async def wait_seen(self, aid, cube_ids, num=None, timeout=None):
+        # until robot aid has seen num of cube_ids itself, default all of them
+        num = len(cube_ids) if num is None else num
+
+        async def wait():
+            while len(set(cube_ids) & set(self.seen[aid])) < num:
+                self.changed[aid].clear()
+                await self.changed[aid].wait()
+        await asyncio.wait_for(wait(), timeout)
+
+    def cube_ids(self):
+        # cubes located by any robot
+        return sorted(self.table)
+
+    def missing(self, aid):
+        # cubes the team has located that robot aid has not seen itself
+        return [cube_id for cube_id in self.cube_ids() if cube_id not in self.seen.get(aid, {})]
+
+    def cube_object(self, aid, cube_id):
+        # robot aid's own object of the cube, None if the robot has not seen it
+        observation = self.seen.get(aid, {}).get(cube_id)
+        return None if observation is None else observation.obj
+
+    def cube_objects(self, aid):
+        # the cube objects robot aid has seen, by cube id
+        return [self.seen[aid][cube_id].obj for cube_id in sorted(self.seen.get(aid, {}))]
+
+    def robot_table(self, aid):
+        # robot aid's seen cube ids, their (C x 2) positions in its frame and (C x C) distances, cached until the robot
+        # sees a cube again
+        if aid not in self._tables:
+            seen = self.seen.get(aid, {})
+            ids = sorted(seen)
+            xy = np.array([[seen[cube_id].x, seen[cube_id].y] for cube_id in ids]).reshape(-1, 2)
+            self._tables[aid] = (ids, xy, distance_matrix(xy, xy))
+        return self._tables[aid]
+
+    def distances(self, aids, cube_ids=None):
+        """
+        :param cube_ids: columns, default cube_ids()
+        :return: (R x C) robot -> cube distances, every robot in its own frame and np.inf for cubes it has not seen,
+                 (C x C) cube -> cube distances, averaged over the robots that have seen both cubes and np.inf where
+                 no robot has
+        """
+        cube_ids = self.cube_ids() if cube_ids is None else list(cube_ids)
+        column = {cube_id: i for i, cube_id in enumerate(cube_ids)}
+        # the robots move, so only the distances to them are computed on every call
+        robot_to_cube = np.full((len(aids), len(cube_ids)), np.inf)
+        for row, aid in enumerate(aids):
+            ids, xy, _ = self.robot_table(aid)
+            rows = [k for k, cube_id in enumerate(ids) if cube_id in column]
+            if rows:
+                position = self.robots[aid].pose.position
+                robot_to_cube[row, [column[ids[k]] for k in rows]] = distance_matrix([[position.x, position.y]],
+                                                                                     xy[rows])[0]
+        return robot_to_cube, self.cube_distances(aids, cube_ids)
+
+    def cube_distances(self, aids, cube_ids):
+        # distances between cubes do not depend on the frame, so every robot's own sightings can be combined. cached
+        # until the next sighting
+        key = (tuple(aids), tuple(cube_ids))
+        if self._cube_to_cube is None or self._cube_to_cube[0] != key:
+            column = {cube_id: i for i, cube_id in enumerate(cube_ids)}
+            total = np.zeros((len(cube_ids), len(cube_ids)))
+            count = np.zeros((len(cube_ids), len(cube_ids)))
+            for aid in aids:
+                ids, _, pairwise = self.robot_table(aid)
+                rows = [k for k, cube_id in enumerate(ids) if cube_id in column]
+                both = np.ix_([column[ids[k]] for k in rows], [column[ids[k]] for k in rows])
+                total[both] += pairwise[np.ix_(rows, rows)]
+                count[both] += 1
+            cube_to_cube = np.full_like(total, np.inf)
+            np.divide(total, count, out=cube_to_cube, where=count > 0)
+            np.fill_diagonal(cube_to_cube, 0.0)
+            self._cube_to_cube = (key, cube_to_cube)
+        return self._cube_to_cube[1]